@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Surrogate-guided sketch selection: profile the sketches that teach the cost
+model the most instead of every sketch in the log.
+
+A cheap surrogate (a bootstrap ensemble of ridge regressors on log-scaled
+workload + schedule features from the sketch records) is fitted to the dataset
+built so far, labelled with log time(ms) at the highest power cap. Unprofiled
+sketches are ranked by:
+  - uncertainty:          ensemble standard deviation of the predicted time
+  - expected-improvement: expected improvement over the fastest profiled
+                          kernel of the same workload (favours fast kernels)
+With fewer than MIN_LABELLED profiled configs, a random sample is taken.
+
+Each round hands the top-k configs to genkernel.py --only, then runs build.sh,
+profile.sh and generate_dataset.py; the selections are logged to
+active_selection.json (--selection-log) once the round's dataset is regenerated,
+keyed by sketch log and --gpu. Records rejected by validation are never selected;
+configs selected MAX_ATTEMPTS times for the same log and GPU that still have no
+dataset rows (failed to build or profile) are not selected again.
+
+Usage:
+    python active_select.py --top-k 32                       # print the next selection only
+    python active_select.py --rounds 5 --top-k 32            # select, build, profile, regenerate
+    python active_select.py --strategy expected-improvement --rounds 3
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from run_pipeline import run_command
+from sketch_records import load_sketch_lines, measured_cost, parse_workload, schedule_features, workload_key
+from validate_sketches import VALIDATION_CACHE, load_verdicts, record_arch, verdict_key
+
+# Selection history, one entry per round
+SELECTION_LOG = "active_selection.json"
+
+# Rounds a config may be selected without producing dataset rows before it is dropped
+MAX_ATTEMPTS = 2
+
+STRATEGIES = ["uncertainty", "expected-improvement"]
+
+# Below this many labelled configs the surrogate is not fitted (random selection)
+MIN_LABELLED = 8
+
+# Surrogate hyper-parameters
+ENSEMBLE_SIZE = 16
+RIDGE_ALPHA = 1.0
+
+# Fixed tile-vector lengths: conv2d has 4 spatial loops x 4 tile levels, 3 reduce loops x 2
+NUM_SPATIAL_TILES = 16
+NUM_REDUCE_TILES = 6
+
+
+def sketch_feature_matrix(lines):
+    """
+    Log-scaled workload and schedule features of every sketch, one row per
+    config index. Missing measured costs are imputed with the column mean.
+    """
+    rows = []
+    for line in lines:
+        w = parse_workload(line)
+        s = schedule_features(line)
+        spatial = (list(s["spatial_tiles"]) + [1] * NUM_SPATIAL_TILES)[:NUM_SPATIAL_TILES]
+        reduce = (list(s["reduce_tiles"]) + [1] * NUM_REDUCE_TILES)[:NUM_REDUCE_TILES]
+        cost = measured_cost(line)
+        rows.append(
+            [w["N"], w["H"], w["W"], w["CO"], w["CI"], w["KH"], w["KW"],
+             w["strides"][0], w["padding"][0] + 1,
+             s["grid"], s["block"], s["num_steps"], s["unroll_max_step"] + 1, s["shared_stages"] + 1]
+            + [t or 1 for t in spatial] + [t or 1 for t in reduce]
+            + [cost * 1e6 if cost else np.nan]
+        )
+    X = np.log2(np.asarray(rows, dtype=np.float64))
+    col_mean = np.nanmean(X, axis=0)
+    missing = np.isnan(X)
+    X[missing] = np.take(np.nan_to_num(col_mean), np.nonzero(missing)[1])
+    return X
+
+
+def load_labels(dataset_file, gpu=None):
+    """
+    {config_idx: log time(ms)} from the highest power cap of each config in dataset_file.
+    """
+    best = {}
+    if not os.path.exists(dataset_file):
+        return {}
+    with open(dataset_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if gpu is not None and row["gpu"] != gpu:
+                continue
+            if not row["time(ms)"] or not row["powercap(w)"]:
+                continue
+            idx, cap, time_ms = int(row["config"]), float(row["powercap(w)"]), float(row["time(ms)"])
+            if time_ms > 0 and (idx not in best or cap > best[idx][0]):
+                best[idx] = (cap, time_ms)
+    return {idx: math.log(time_ms) for idx, (_, time_ms) in best.items()}
+
+
+class RidgeEnsemble:
+    """
+    Bootstrap ensemble of ridge regressors on standardised features.
+    """
+
+    def __init__(self, size=ENSEMBLE_SIZE, alpha=RIDGE_ALPHA, seed=0):
+        self.size = size
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+
+    def fit(self, X, y):
+        self.mean = X.mean(axis=0)
+        self.std = X.std(axis=0)
+        self.std[self.std == 0] = 1.0
+        Z = np.hstack([(X - self.mean) / self.std, np.ones((len(X), 1))])
+        penalty = self.alpha * np.eye(Z.shape[1])
+        penalty[-1, -1] = 0.0  # no penalty on the intercept
+
+        weights = []
+        for _ in range(self.size):
+            sample = self.rng.integers(0, len(Z), len(Z))
+            Zs, ys = Z[sample], y[sample]
+            weights.append(np.linalg.solve(Zs.T @ Zs + penalty, Zs.T @ ys))
+        self.weights = np.column_stack(weights)
+        return self
+
+    def predict(self, X):
+        """Return (mean, std) of the ensemble's predictions."""
+        Z = np.hstack([(X - self.mean) / self.std, np.ones((len(X), 1))])
+        predictions = Z @ self.weights
+        return predictions.mean(axis=1), predictions.std(axis=1)
+
+
+def _normal_cdf(z):
+    return 0.5 * (1.0 + np.vectorize(math.erf)(z / math.sqrt(2.0)))
+
+
+def _normal_pdf(z):
+    return np.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+
+
+def expected_improvement(mu, sigma, best):
+    """Expected decrease of log time below best (per candidate)."""
+    sigma = np.maximum(sigma, 1e-9)
+    z = (best - mu) / sigma
+    return (best - mu) * _normal_cdf(z) + sigma * _normal_pdf(z)
+
+
+def select(lines, labels, candidates, top_k, strategy="uncertainty", seed=0):
+    """
+    Rank candidate config indices and return the top_k as a list of (idx, score).
+    """
+    rng = np.random.default_rng(seed)
+    candidates = np.asarray(sorted(candidates), dtype=np.int64)
+    if len(candidates) == 0:
+        return []
+    if len(labels) < MIN_LABELLED:
+        picked = rng.choice(candidates, size=min(top_k, len(candidates)), replace=False)
+        return [(int(idx), float("nan")) for idx in sorted(picked)]
+
+    X = sketch_feature_matrix(lines)
+    labelled = np.asarray(sorted(labels), dtype=np.int64)
+    y = np.asarray([labels[idx] for idx in labelled])
+    model = RidgeEnsemble(seed=seed).fit(X[labelled], y)
+    mu, sigma = model.predict(X[candidates])
+
+    if strategy == "expected-improvement":
+        # Improvement over the fastest profiled kernel of the same workload;
+        # unseen workloads are compared against their own predicted time
+        workload_best = {}
+        for idx in labelled:
+            key = workload_key(lines[idx])
+            workload_best[key] = min(workload_best.get(key, np.inf), labels[int(idx)])
+        best = np.array([workload_best.get(workload_key(lines[idx]), m) for idx, m in zip(candidates, mu)])
+        scores = expected_improvement(mu, sigma, best)
+    else:
+        scores = sigma
+
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+def unprofiled_candidates(lines, labels, arch=None, cache_path=VALIDATION_CACHE, exhausted=()):
+    """
+    Config indices without labels, excluding records cached as invalid and
+    exhausted ones (selected MAX_ATTEMPTS times without producing rows).
+    """
+    verdicts = load_verdicts(cache_path)
+    exhausted = set(exhausted)
+    candidates = []
+    for idx, line in enumerate(lines):
+        if idx in labels or idx in exhausted:
+            continue
+        verdict = verdicts.get(verdict_key(line, record_arch(line, arch)))
+        if verdict is not None and not verdict["valid"]:
+            continue
+        candidates.append(idx)
+    return candidates
+
+
+def load_selection_history(path=SELECTION_LOG):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return []
+
+
+def exhausted_configs(history, log_file, gpu, labels, max_attempts=MAX_ATTEMPTS):
+    """
+    Config indices selected at least max_attempts times for this sketch log and
+    GPU (rounds of other logs or GPUs do not count) that still have no labels.
+    """
+    log_file = os.path.abspath(log_file)
+    attempts = {}
+    for entry in history:
+        if entry.get("log_file") != log_file or entry.get("gpu") != gpu:
+            continue
+        for idx in entry["selected"]:
+            attempts[idx] = attempts.get(idx, 0) + 1
+    return {idx for idx, count in attempts.items() if count >= max_attempts and idx not in labels}
+
+
+def log_selection(round_info, path=SELECTION_LOG):
+    history = load_selection_history(path)
+    history.append(round_info)
+    with open(path, "w") as f:
+        json.dump(history, f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Surrogate-guided sketch selection for profiling")
+    parser.add_argument("--log-file", "-f", type=str, default="allkernels.json",
+                        help="Path to the sketch JSON file (default: allkernels.json)")
+    parser.add_argument("--dataset", "-d", type=str, default="dataset_feature.csv",
+                        help="Dataset built so far (default: dataset_feature.csv)")
+    parser.add_argument("--gpu", type=str, default=None,
+                        help="Only use dataset rows of this GPU (e.g. A100)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="uncertainty",
+                        help="Ranking of unprofiled sketches (default: uncertainty)")
+    parser.add_argument("--top-k", type=int, default=32,
+                        help="Sketches selected per round (default: 32)")
+    parser.add_argument("--rounds", type=int, default=0,
+                        help="Select, generate, build, profile and regenerate the dataset this many "
+                             "times (default: 0, print the next selection only)")
+    parser.add_argument("--arch", type=str, default=None,
+                        help="Architecture for validation verdicts (default: each record's target)")
+    parser.add_argument("--selection-log", type=str, default=SELECTION_LOG,
+                        help=f"Selection history (default: {SELECTION_LOG})")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="Stop selecting a config after this many rounds without dataset rows "
+                             f"(default: {MAX_ATTEMPTS})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lines = load_sketch_lines(args.log_file)
+
+    for round_idx in range(max(args.rounds, 1)):
+        labels = {idx: y for idx, y in load_labels(args.dataset, args.gpu).items() if idx < len(lines)}
+        exhausted = exhausted_configs(load_selection_history(args.selection_log), args.log_file,
+                                      args.gpu, labels, args.max_attempts)
+        candidates = unprofiled_candidates(lines, labels, args.arch, exhausted=exhausted)
+        selection = select(lines, labels, candidates, args.top_k, args.strategy, args.seed + round_idx)
+        print(f"\nRound {round_idx + 1}: {len(labels)} profiled, {len(candidates)} candidate(s), "
+              f"selected {len(selection)} ({args.strategy if len(labels) >= MIN_LABELLED else 'random'})")
+        for idx, score in selection:
+            print(f"  config {idx}  score {score:.4g}")
+
+        if not selection:
+            print("No unprofiled sketches left")
+            break
+        if args.rounds == 0:
+            print(f"\nGenerate them with: python genkernel.py -f {args.log_file} "
+                  f"--only {','.join(str(idx) for idx, _ in selection)}")
+            break
+
+        only = ",".join(str(idx) for idx, _ in selection)
+        run_command(["python", "genkernel.py", "-f", args.log_file, "--only", only],
+                    f"Generating {len(selection)} selected kernel(s)")
+        run_command("bash build.sh", "Building selected kernels", shell=True)
+        run_command("bash profile.sh", "Profiling selected kernels", shell=True)
+        run_command(["python", "generate_dataset.py", "-o", args.dataset, "-f", args.log_file],
+                    "Regenerating the dataset")
+        log_selection({"round": round_idx + 1, "log_file": os.path.abspath(args.log_file), "gpu": args.gpu,
+                       "strategy": args.strategy, "profiled": len(labels),
+                       "selected": [idx for idx, _ in selection]}, args.selection_log)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Adaptive power-cap sweep: a faster alternative to profile.sh.
+
+profile.sh profiles every kernel at every power cap. Many small kernels never
+reach the power limit, so their results are identical at every cap. This driver:
+  1. profiles every config at the highest and the lowest power cap
+  2. compares Duration and SM Frequency between the two extremes
+  3. if both differ by less than --tolerance, the intermediate caps are recorded
+     as derived rows (a copy of the highest-cap export, listed in
+     ncu_results/derived.json); otherwise the config is profiled at every cap
+
+Caps are visited in the order max, min, then the intermediates ascending, so the
+power limit is changed once per cap (never per kernel) and moves in small steps.
+
+Usage:
+    python adaptive_profile.py                    # uses kernel/configs.json from genkernel.py
+    python adaptive_profile.py --tolerance 0.05
+    python adaptive_profile.py --configs kernel_V100/configs.json   # a tree of genkernel.py --targets
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from compress_ncu_results import process_file
+from extract_ncu_metrics import extract_and_transform_metrics
+from generate_dataset import DERIVED_MANIFEST, NCU_RESULTS_DIR
+from hardware_info import POWER_CAP_CONFIGS, detect_gpu_type
+from telemetry import TelemetrySampler, settle_after_power_cap, summarize
+
+# Configuration manifest written by genkernel.py
+CONFIGS_FILE = "kernel/configs.json"
+
+# Launcher manifest written by genkernel.py --export-module, in the kernel tree
+LAUNCH_MANIFEST = "launch_manifest.txt"
+
+# Features compared between the extreme power caps
+COMPARED_FEATURES = ["time(ms)", "sm_freq(ghz)"]
+
+
+def load_configs(path=CONFIGS_FILE):
+    """
+    Load the configuration list written by genkernel.py. Each config is tagged
+    with the kernel and build directories of its tree (kernel/ and build/, or
+    kernel_<name>/ and build_<name>/ with genkernel.py --targets).
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    for config in manifest["configs"]:
+        config.setdefault("kernel_dir", manifest.get("kernel_dir", "kernel"))
+        config.setdefault("build_dir", manifest.get("build_dir", "build"))
+    return manifest["configs"]
+
+
+def set_power_cap(watts):
+    """
+    Set the GPU 0 power limit and wait until it has taken effect.
+    Returns the settle outcome (telemetry.SETTLED, TIMED_OUT or FALLBACK).
+    """
+    print(f"Setting GPU 0 power cap to {watts}W...")
+    subprocess.run(["sudo", "nvidia-smi", "-i", "0", "-pl", str(watts)], check=True)
+    return settle_after_power_cap(watts, allow_fallback=True)
+
+
+def ncu_command(config, output_path):
+    """Return the ncu command line that profiles one configuration."""
+    return [
+        "ncu", "--target-processes", "all",
+        "--set", "full",
+        "--print-details", "all",
+        "--csv",
+        "--log-file", output_path,
+    ] + kernel_command(config)
+
+
+def kernel_command(config):
+    """
+    Command line that runs one configuration: the generic launcher for configs
+    exported with genkernel.py --export-module, else <build_dir>/kernel_<idx>.
+    """
+    build_dir = config.get("build_dir", "build")
+    if "module" in config:
+        manifest = os.path.join(config.get("kernel_dir", "kernel"), LAUNCH_MANIFEST)
+        return [f"./{build_dir}/launcher", manifest, str(config["idx"])]
+    return [
+        f"./{build_dir}/kernel_{config['idx']}",
+        str(config["N"]), str(config["H"]), str(config["W"]),
+        str(config["CO"]), str(config["CI"]), str(config["KH"]), str(config["KW"]),
+        str(config["strides"][0]), str(config["padding"][0]),
+    ]
+
+
+def profile_config(config, output_dir, codec="none", prune=False, sampler=None):
+    """
+    Profile one configuration into output_dir/ncu_config_<idx>.csv.
+    With a running TelemetrySampler, the samples taken during the run are
+    written to output_dir/telemetry_config_<idx>.json.
+    Returns the path of the (possibly compressed) export.
+    """
+    executable = kernel_command(config)[0]
+    if not os.path.exists(executable):
+        raise FileNotFoundError(f"{executable} not found. Please run build.sh first.")
+
+    output_path = os.path.join(output_dir, f"ncu_config_{config['idx']}.csv")
+    if sampler is None:
+        subprocess.run(ncu_command(config, output_path), check=True)
+    else:
+        with sampler.window(config["idx"]) as samples:
+            subprocess.run(ncu_command(config, output_path), check=True)
+        with open(os.path.join(output_dir, f"telemetry_config_{config['idx']}.json"), "w") as f:
+            json.dump({"summary": summarize(samples), "samples": samples}, f)
+    if codec != "none" or prune:
+        output_path = process_file(output_path, codec=codec, prune=prune,
+                                   ncu_dir=os.path.dirname(os.path.normpath(output_dir)))
+    return output_path
+
+
+def relative_difference(a, b):
+    """|a - b| / max(|a|, |b|), or None if either value is missing."""
+    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+        return None
+    scale = max(abs(a), abs(b))
+    return abs(a - b) / scale if scale else 0.0
+
+
+def is_power_insensitive(high_export, low_export, tolerance):
+    """
+    True if Duration and SM Frequency at the highest and lowest power caps
+    differ by less than tolerance (relative).
+    """
+    high = extract_and_transform_metrics(high_export)
+    low = extract_and_transform_metrics(low_export)
+    for feature in COMPARED_FEATURES:
+        diff = relative_difference(high.get(feature), low.get(feature))
+        if diff is None or diff >= tolerance:
+            return False
+    return True
+
+
+def write_derived_manifest(ncu_dir, tolerance, power_caps, derived):
+    """Atomically write ncu_dir/derived.json listing the derived rows."""
+    path = os.path.join(ncu_dir, DERIVED_MANIFEST)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"tolerance": tolerance, "power_caps": power_caps, "derived": derived}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def adaptive_sweep(configs, power_caps, ncu_dir=NCU_RESULTS_DIR, tolerance=0.02,
+                   codec="none", prune=False, sampler=None):
+    """
+    Profile configs over power_caps (ascending list of watts) adaptively.
+    The derived-row manifest is rewritten as soon as each intermediate cap's
+    copies are made, before that cap is profiled, so a sweep that fails midway
+    never leaves copied exports that the manifest does not list.
+    Returns (profiled_runs, derived_entries).
+    """
+    num_caps = len(power_caps)
+
+    def cap_dir(pc_idx):
+        return os.path.join(ncu_dir, f"powercap{pc_idx}")
+
+    for pc_idx in range(1, num_caps + 1):
+        os.makedirs(cap_dir(pc_idx), exist_ok=True)
+
+    runs = 0
+    exports = {}  # (config_idx, powercap_idx) -> export path
+
+    # Pass 1 + 2: extremes (max first, then min)
+    extremes = [num_caps, 1] if num_caps > 1 else [1]
+    for pc_idx in extremes:
+        set_power_cap(power_caps[pc_idx - 1])
+        for config in configs:
+            print(f"Profiling config {config['idx']} at {power_caps[pc_idx - 1]}W...")
+            exports[(config["idx"], pc_idx)] = profile_config(config, cap_dir(pc_idx), codec, prune, sampler)
+            runs += 1
+
+    if num_caps <= 2:
+        return runs, []
+
+    # Decide which configs need the intermediate caps
+    sensitive = []
+    insensitive = []
+    for config in configs:
+        if is_power_insensitive(exports[(config["idx"], num_caps)],
+                                exports[(config["idx"], 1)], tolerance):
+            insensitive.append(config)
+        else:
+            sensitive.append(config)
+    print(f"\n{len(insensitive)} config(s) power-insensitive (within {tolerance:.1%}), "
+          f"{len(sensitive)} config(s) need intermediate caps\n")
+
+    # Pass 3: intermediate caps, ascending from the lowest, one power change each
+    derived = []
+    for pc_idx in range(2, num_caps):
+        for config in insensitive:
+            source = exports[(config["idx"], num_caps)]
+            target = os.path.join(cap_dir(pc_idx), os.path.basename(source))
+            derived.append({"config": config["idx"], "powercap_idx": pc_idx,
+                            "source_powercap_idx": num_caps})
+            shutil.copyfile(source, target)
+        if insensitive:
+            write_derived_manifest(ncu_dir, tolerance, power_caps, derived)
+        if sensitive:
+            set_power_cap(power_caps[pc_idx - 1])
+        for config in sensitive:
+            print(f"Profiling config {config['idx']} at {power_caps[pc_idx - 1]}W...")
+            profile_config(config, cap_dir(pc_idx), codec, prune, sampler)
+            runs += 1
+
+    return runs, derived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive power-cap profiling sweep")
+    parser.add_argument("--configs", type=str, default=CONFIGS_FILE,
+                        help=f"Configuration manifest from genkernel.py (default: {CONFIGS_FILE})")
+    parser.add_argument("--ncu-dir", type=str, default=NCU_RESULTS_DIR,
+                        help=f"NCU results directory (default: {NCU_RESULTS_DIR})")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Max relative Duration/SM Frequency difference between the extreme "
+                             "caps for a config to be treated as power-insensitive (default: 0.02)")
+    parser.add_argument("--compress", choices=["none", "gzip", "zstd"], default="none",
+                        help="Compress each NCU export after it is written (default: none)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Prune each NCU export to the metrics used by the dataset (raw originals are "
+                             "archived in ncu_results_raw/)")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Record power/clock telemetry during every run (telemetry_config_<idx>.json)")
+    args = parser.parse_args()
+
+    gpu_type = detect_gpu_type()
+    if gpu_type is None:
+        print("ERROR: Unknown GPU model, cannot select power caps")
+        print(f"Supported GPUs: {', '.join(POWER_CAP_CONFIGS)}")
+        return 1
+    power_caps = POWER_CAP_CONFIGS[gpu_type]
+    configs = load_configs(args.configs)
+
+    print("======================================")
+    print(f"Adaptive profiling: {len(configs)} config(s) on {gpu_type}")
+    print(f"Power cap settings: {power_caps} W")
+    print("======================================")
+
+    # Every export of this sweep is profiled or listed as derived; drop a stale manifest
+    derived_path = os.path.join(args.ncu_dir, DERIVED_MANIFEST)
+    if os.path.exists(derived_path):
+        os.remove(derived_path)
+
+    sampler = TelemetrySampler().start() if args.telemetry else None
+    try:
+        runs, derived = adaptive_sweep(configs, power_caps, args.ncu_dir, args.tolerance,
+                                       args.compress, args.prune, sampler)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    write_derived_manifest(args.ncu_dir, args.tolerance, power_caps, derived)
+
+    full_runs = len(configs) * len(power_caps)
+    print("\n======================================")
+    print("Adaptive profiling completed!")
+    print("======================================")
+    print(f"Profiling runs: {runs} (full sweep: {full_runs}, saved {full_runs - runs})")
+    print(f"Derived rows: {len(derived)} (listed in {args.ncu_dir}/{DERIVED_MANIFEST})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
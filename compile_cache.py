@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Compile cache for generated kernel executables.
+
+Each build/kernel_<idx> executable is cached under a key made of:
+  - the generated kernel/kernel<idx>.cuh and kernel/kernel<idx>.cu sources, with
+    the config index replaced by a placeholder, so the same kernel at another
+    index or in another sketch log hits the same entry
+  - the template files (template/main.cpp, template/common.h) and CMakeLists.txt
+    (which holds the nvcc flags)
+  - the CUDA architecture (CMAKE_CUDA_ARCHITECTURES) and the nvcc version
+
+On a hit the cached executable is copied to build/kernel_<idx> under the current
+index (its device function keeps the kernel<idx> name it was first built with,
+which the dataset does not use); on a miss the
+kernel is built with CMake and the result is stored. Entries are shared across
+runs and sketch logs, hit/miss statistics are kept in <cache>/stats.json, and the
+cache is bounded in size (least recently used entries are evicted first).
+
+Usage:
+    python compile_cache.py build --all                 # build every kernel/kernel*.cu
+    python compile_cache.py build 0 1 2 --arch 86
+    python compile_cache.py --kernel-dir kernel_V100 --build-dir build_V100 build --all --arch 70
+    python compile_cache.py stats
+    python compile_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+from hardware_info import cuda_arch
+
+# Default cache directory and size bound
+CACHE_DIR = ".compile_cache"
+MAX_CACHE_MB = 2048
+
+KERNEL_DIR = "kernel"
+BUILD_DIR = "build"
+
+# Files every kernel executable depends on, besides its own kernel sources
+SHARED_INPUTS = ["template/main.cpp", "template/common.h", "CMakeLists.txt"]
+
+# Stands in for the config index in hashed kernel sources
+INDEX_PLACEHOLDER = b"@IDX@"
+
+
+def detect_cuda_arch():
+    """
+    Compute capability of GPU 0 from the shared hardware snapshot (e.g. '8.6' -> '86').
+    Returns None if no GPU can be queried.
+    """
+    return cuda_arch()
+
+
+def nvcc_version():
+    """Return the nvcc release string, or 'unknown' if nvcc is not on PATH."""
+    try:
+        result = subprocess.run(["nvcc", "--version"], capture_output=True, text=True, check=True)
+        match = re.search(r"release ([\d.]+), V([\d.]+)", result.stdout)
+        return match.group(0) if match else result.stdout.strip().splitlines()[-1]
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+
+def index_independent_source(source, idx):
+    """
+    Replace the config index genkernel.py writes into a kernel's sources
+    (kernel<idx>, kernel<idx>.cuh, size_grid_<idx>, size_block_<idx>) by
+    INDEX_PLACEHOLDER.
+    """
+    pattern = rb"\b(kernel|size_grid_|size_block_)" + str(idx).encode() + rb"\b"
+    return re.sub(pattern, rb"\1" + INDEX_PLACEHOLDER, source)
+
+
+class CompileCache:
+    """
+    Content-addressed cache of kernel executables.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=MAX_CACHE_MB, arch=None,
+                 kernel_dir=KERNEL_DIR, build_dir=BUILD_DIR):
+        self.cache_dir = cache_dir
+        self.kernel_dir = kernel_dir
+        self.build_dir = build_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.arch = arch
+        self.toolchain = nvcc_version()
+        self.stats_file = os.path.join(cache_dir, "stats.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = self._load_stats()
+        self._shared_digest = None
+
+    def _load_stats(self):
+        if os.path.exists(self.stats_file):
+            with open(self.stats_file) as f:
+                return json.load(f)
+        return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def save_stats(self):
+        with open(self.stats_file, "w") as f:
+            json.dump(self.stats, f, indent=2)
+
+    def _hash_shared_inputs(self):
+        """Hash template files, CMakeLists.txt, arch and toolchain (once per run)."""
+        if self._shared_digest is None:
+            h = hashlib.sha256()
+            for path in SHARED_INPUTS:
+                h.update(path.encode())
+                with open(path, "rb") as f:
+                    h.update(f.read())
+            h.update(f"arch={self.arch}".encode())
+            h.update(f"nvcc={self.toolchain}".encode())
+            self._shared_digest = h.hexdigest()
+        return self._shared_digest
+
+    def key(self, idx):
+        """Return the cache key of build/kernel_<idx> (independent of idx itself)."""
+        h = hashlib.sha256(self._hash_shared_inputs().encode())
+        for suffix in (".cuh", ".cu"):
+            with open(os.path.join(self.kernel_dir, f"kernel{idx}{suffix}"), "rb") as f:
+                h.update(index_independent_source(f.read(), idx))
+        return h.hexdigest()[:32]
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def build(self, idx):
+        """
+        Make build/kernel_<idx> available, from the cache if possible.
+        Returns True on a cache hit, False if the kernel was compiled.
+        """
+        key = self.key(idx)
+        entry = self._entry_path(key)
+        cached_binary = os.path.join(entry, "kernel")
+        target = os.path.join(self.build_dir, f"kernel_{idx}")
+        os.makedirs(self.build_dir, exist_ok=True)
+
+        if os.path.exists(cached_binary):
+            shutil.copy2(cached_binary, target)
+            # Touch the entry so LRU eviction keeps recently used kernels
+            os.utime(cached_binary, None)
+            self.stats["hits"] += 1
+            print(f"[cache hit]  kernel_{idx} ({key[:12]})")
+            return True
+
+        self.stats["misses"] += 1
+        print(f"[cache miss] kernel_{idx} ({key[:12]}), compiling...")
+        self._compile(idx)
+
+        os.makedirs(entry, exist_ok=True)
+        shutil.copy2(target, cached_binary + ".tmp")
+        os.replace(cached_binary + ".tmp", cached_binary)
+        with open(os.path.join(entry, "meta.json"), "w") as f:
+            json.dump({"config_idx": idx, "arch": self.arch,
+                       "toolchain": self.toolchain, "created": time.time()}, f)
+        return False
+
+    def _compile(self, idx):
+        """Configure and build one kernel executable with CMake."""
+        cmake_cmd = ["cmake", "-S", ".", "-B", self.build_dir, f"-DCONFIG_IDX={idx}",
+                     f"-DKERNEL_DIR={self.kernel_dir}"]
+        if self.arch:
+            cmake_cmd.append(f"-DCUDA_ARCH={self.arch}")
+        subprocess.run(cmake_cmd, check=True)
+        subprocess.run(["cmake", "--build", self.build_dir, "--target", f"kernel_{idx}", "-j"], check=True)
+
+    def entries(self):
+        """Return [(mtime, size, entry_dir)] for all cached executables."""
+        result = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                binary = os.path.join(prefix_dir, key, "kernel")
+                if os.path.exists(binary):
+                    st = os.stat(binary)
+                    result.append((st.st_mtime, st.st_size, os.path.join(prefix_dir, key)))
+        return result
+
+    def evict(self):
+        """Evict least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self.stats["evictions"] += 1
+        return total
+
+
+def list_kernel_indices(kernel_dir=KERNEL_DIR):
+    """Return sorted config indices of all kernel/kernel<idx>.cu files."""
+    indices = []
+    if os.path.isdir(kernel_dir):
+        for filename in os.listdir(kernel_dir):
+            match = re.fullmatch(r"kernel(\d+)\.cu", filename)
+            if match:
+                indices.append(int(match.group(1)))
+    return sorted(indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile cache for generated kernel executables")
+    parser.add_argument("--cache-dir", type=str, default=CACHE_DIR,
+                        help=f"Cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--max-mb", type=float, default=MAX_CACHE_MB,
+                        help=f"Maximum cache size in MB (default: {MAX_CACHE_MB})")
+    parser.add_argument("--kernel-dir", type=str, default=KERNEL_DIR,
+                        help=f"Generated kernel tree (default: {KERNEL_DIR}; genkernel.py --targets "
+                             "writes kernel_<name>)")
+    parser.add_argument("--build-dir", type=str, default=BUILD_DIR,
+                        help=f"Build directory of the executables (default: {BUILD_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build kernels through the cache")
+    p_build.add_argument("indices", nargs="*", type=int, help="Config indices to build")
+    p_build.add_argument("--all", action="store_true", help="Build every kernel*.cu of the kernel tree")
+    p_build.add_argument("--arch", type=str, default=None,
+                         help="CUDA architecture, e.g. 86 (default: detect GPU 0 once)")
+
+    sub.add_parser("stats", help="Print cache statistics")
+    sub.add_parser("clear", help="Remove all cached executables")
+
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+        print(f"Cleared {args.cache_dir}/")
+        return 0
+
+    arch = getattr(args, "arch", None) or (detect_cuda_arch() if args.command == "build" else None)
+    cache = CompileCache(args.cache_dir, args.max_mb, arch=arch,
+                         kernel_dir=args.kernel_dir, build_dir=args.build_dir)
+
+    if args.command == "build":
+        indices = list_kernel_indices(args.kernel_dir) if args.all else args.indices
+        if not indices:
+            print("No kernels to build (pass config indices or --all)")
+            return 1
+        print(f"CUDA architecture: {arch or 'CMake default'}")
+        hits = 0
+        try:
+            for idx in indices:
+                hits += cache.build(idx)
+        finally:
+            cache.evict()
+            cache.save_stats()
+        print(f"\nCompile cache: {hits} hit(s), {len(indices) - hits} miss(es) this run")
+
+    entries = cache.entries()
+    total = sum(size for _, size, _ in entries)
+    lifetime = cache.stats["hits"] + cache.stats["misses"]
+    rate = 100.0 * cache.stats["hits"] / lifetime if lifetime else 0.0
+    print(f"Cache: {len(entries)} entries, {total / 1048576:.1f} MB / {cache.max_bytes / 1048576:.0f} MB")
+    print(f"Lifetime: {cache.stats['hits']} hit(s), {cache.stats['misses']} miss(es) "
+          f"({rate:.1f}% hit rate), {cache.stats['evictions']} eviction(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
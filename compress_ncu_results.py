@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Compress and/or prune NCU CSV exports in ncu_results/.
+
+`--set full --print-details all` exports are large, but the dataset only uses the
+metrics listed in extract_ncu_metrics.METRIC_TRANSFORMS. This script can:
+  - compress each export (gzip, or zstd with the optional 'zstandard' package)
+  - prune each export down to the header + the rows the dataset uses
+  - keep the raw originals (gzip-compressed) in an archive tree that mirrors
+    the ncu_results/ layout, e.g. ncu_results_raw/powercap1/ncu_config_0.csv.gz
+    (pruning is lossy, so it always archives, to ncu_results_raw/ by default)
+
+Output files keep the ncu_config_<idx>.csv name with a .gz / .zst suffix, which
+generate_dataset.py and extract_ncu_metrics.py read directly.
+
+Usage:
+    python compress_ncu_results.py                          # gzip everything in ncu_results/
+    python compress_ncu_results.py --prune                  # raw originals -> ncu_results_raw/
+    python compress_ncu_results.py --codec zstd ncu_results/powercap1/ncu_config_0.csv
+"""
+import argparse
+import csv
+import gzip
+import io
+import os
+import shutil
+import sys
+
+from extract_ncu_metrics import WANTED_METRICS, open_ncu_export
+
+# NCU results directory
+NCU_RESULTS_DIR = "ncu_results"
+
+# Archive of raw originals used when pruning without an explicit archive directory
+RAW_ARCHIVE_DIR = "ncu_results_raw"
+
+CODEC_SUFFIXES = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def _open_output(path, codec):
+    """Open a text stream that writes with the given codec."""
+    if codec == "gzip":
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+        raw = open(path, "wb")
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def _copy_lines(src, dst, prune):
+    """
+    Copy an NCU export line by line, optionally keeping only the CSV header
+    and the rows whose 'Metric Name' is used by the dataset.
+    """
+    if not prune:
+        shutil.copyfileobj(src, dst)
+        return
+
+    wanted = set(WANTED_METRICS)
+    lines = (line for line in src if not line.lstrip().startswith("==PROF=="))
+    reader = csv.reader(lines)
+    writer = csv.writer(dst, lineterminator="\n")
+
+    header = next(reader, None)
+    if header is None:
+        return
+    writer.writerow(header)
+    if "Metric Name" not in header:
+        # Not a --print-details export; keep everything
+        writer.writerows(reader)
+        return
+
+    name_col = header.index("Metric Name")
+    for row in reader:
+        if len(row) > name_col and row[name_col] in wanted:
+            writer.writerow(row)
+
+
+def _is_pruned(path):
+    """True if a --print-details export only has rows of metrics used by the dataset."""
+    wanted = set(WANTED_METRICS)
+    with open_ncu_export(path) as src:
+        reader = csv.reader(line for line in src if not line.lstrip().startswith("==PROF=="))
+        header = next(reader, None)
+        if header is None or "Metric Name" not in header:
+            return False
+        name_col = header.index("Metric Name")
+        return all(row[name_col] in wanted for row in reader if len(row) > name_col)
+
+
+def _strip_suffix(path):
+    """Return path without any compression suffix."""
+    for suffix in (".gz", ".zst"):
+        if path.endswith(suffix):
+            return path[: -len(suffix)]
+    return path
+
+
+def process_file(path, codec="gzip", prune=False, archive_dir=None, ncu_dir=NCU_RESULTS_DIR):
+    """
+    Compress and/or prune one NCU export in place.
+
+    The output is written next to the input as ncu_config_<idx>.csv[.gz|.zst];
+    the input is removed afterwards. If archive_dir is given, the raw input is
+    first saved gzip-compressed under archive_dir/<path relative to ncu_dir>.gz.
+    Pruning drops rows for good, so with prune=True the raw input is always
+    archived (to RAW_ARCHIVE_DIR unless archive_dir is given).
+    An existing archive entry is never overwritten: already pruned inputs are not
+    archived, and a raw input whose archive entry exists is left unpruned.
+    Returns the path of the written file.
+    """
+    base = _strip_suffix(path)
+    output = base + CODEC_SUFFIXES[codec]
+    if prune and not archive_dir:
+        archive_dir = RAW_ARCHIVE_DIR
+
+    # Already pruned inputs have no raw rows left to archive
+    archive_path = None
+    if archive_dir and not _is_pruned(path):
+        rel = os.path.relpath(base, ncu_dir)
+        archive_path = os.path.join(archive_dir, rel) + ".gz"
+        if os.path.exists(archive_path):
+            if prune:
+                print(f"Warning: {archive_path} already exists, leaving {path} unpruned")
+                return path
+            archive_path = None
+
+    if archive_path:
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        if path.endswith(".gz"):
+            shutil.copyfile(path, archive_path)
+        else:
+            with open_ncu_export(path) as src, gzip.open(archive_path, "wt", newline="", encoding="utf-8") as dst:
+                shutil.copyfileobj(src, dst)
+
+    if output == path and not prune:
+        return path
+
+    tmp_output = output + ".tmp"
+    with open_ncu_export(path) as src, _open_output(tmp_output, codec) as dst:
+        _copy_lines(src, dst, prune)
+    os.replace(tmp_output, output)
+
+    if output != path:
+        os.remove(path)
+    return output
+
+
+def find_exports(ncu_dir):
+    """Return all ncu_config_* exports under ncu_dir/powercap*/."""
+    exports = []
+    if not os.path.isdir(ncu_dir):
+        return exports
+    for subdir_name in sorted(os.listdir(ncu_dir)):
+        subdir_path = os.path.join(ncu_dir, subdir_name)
+        if not (os.path.isdir(subdir_path) and subdir_name.startswith("powercap")):
+            continue
+        for filename in sorted(os.listdir(subdir_path)):
+            if filename.startswith("ncu_config_") and filename.endswith((".csv", ".csv.gz", ".csv.zst")):
+                exports.append(os.path.join(subdir_path, filename))
+    return exports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress and/or prune NCU CSV exports")
+    parser.add_argument("files", nargs="*",
+                        help="Exports to process (default: every export under --ncu-dir)")
+    parser.add_argument("--ncu-dir", type=str, default=NCU_RESULTS_DIR,
+                        help=f"NCU results directory (default: {NCU_RESULTS_DIR})")
+    parser.add_argument("--codec", choices=sorted(CODEC_SUFFIXES), default="gzip",
+                        help="Compression codec (default: gzip)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Keep only the metric rows used by the dataset")
+    parser.add_argument("--archive", type=str, default=None,
+                        help="Keep gzip-compressed raw originals in this directory "
+                             f"(with --prune: default {RAW_ARCHIVE_DIR})")
+    args = parser.parse_args()
+    if args.prune and not args.archive:
+        args.archive = RAW_ARCHIVE_DIR
+
+    files = args.files or find_exports(args.ncu_dir)
+    if not files:
+        print(f"No NCU exports found in '{args.ncu_dir}/powercap*/'")
+        return 0
+
+    before = after = 0
+    for path in files:
+        before += os.path.getsize(path)
+        output = process_file(path, codec=args.codec, prune=args.prune,
+                              archive_dir=args.archive, ncu_dir=args.ncu_dir)
+        after += os.path.getsize(output)
+
+    print(f"Processed {len(files)} export(s): {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    if args.archive:
+        print(f"Raw originals archived in: {args.archive}/")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Local indexed query service over a generated dataset, shared by training loops.
+
+One long-lived process loads dataset_feature.csv (or dataset_timing.csv) once
+into float64 columns and an index of row positions per (gpu, power cap), sorted
+by config. Trainers query slices over localhost HTTP instead of each parsing
+the CSV:
+
+    GET /query?gpu=A100&powercap=250,300&config=0-499&features=time(ms),sm_freq(ghz)
+    GET /info
+
+/query answers with a compact binary frame: a 4-byte little-endian header
+length, a JSON header ({"rows", "columns", "gpus", "version"}), then one
+little-endian float64 buffer per column (column-major). The key columns config,
+gpu (index into "gpus") and powercap(w) come first. Add &format=json for a JSON
+body instead. fetch() decodes the frame into NumPy arrays.
+
+Rows appended to the CSV (generate_dataset.py runs, merged GPUs) are picked up
+on the next request: only the new complete lines are parsed. A rewritten file
+(header or parsed prefix changed, or shorter) is reloaded in full.
+
+Usage:
+    python dataset_server.py serve -d dataset_feature.csv            # 127.0.0.1:8765
+    python dataset_server.py query --gpu A100 --powercap 250 --config 0-99 --features "time(ms)"
+    python dataset_server.py info
+
+    from dataset_server import fetch
+    columns, header = fetch(gpu="A100", features=["time(ms)", "sm_freq(ghz)"])   # {name: np.ndarray}
+"""
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+# Columns returned with every slice, ahead of the requested features
+KEY_COLUMNS = ["config", "gpu", "powercap(w)"]
+
+# Bytes before the parsed offset compared on reload to detect a rewritten file
+TAIL_CHECK_BYTES = 256
+
+# Everything a query reads, published as one immutable snapshot per (re)load
+DatasetView = collections.namedtuple("DatasetView", ["header", "columns", "gpus", "index", "version"])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan  # empty cell or text
+
+
+def parse_config_range(text):
+    """Parse '7', '0-99', '100-' or '-99' into an inclusive (lo, hi) config range."""
+    lo, sep, hi = text.partition("-")
+    if not sep:
+        return int(lo), int(lo)
+    return (int(lo) if lo else 0), (int(hi) if hi else sys.maxsize)
+
+
+class DatasetIndex:
+    """
+    In-memory columns of a dataset CSV with a (gpu, powercap) -> rows index.
+    Queries read only self.view, a DatasetView (header, columns, gpus, index,
+    version) that a reload builds completely and swaps in with one assignment
+    under the lock, so they never combine the header of one load with the rows
+    of another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.view = None
+        self.reloads = {"full": 0, "append": 0}
+        with self.lock:
+            self._load_full()
+
+    @property
+    def version(self):
+        return self.view.version
+
+    @staticmethod
+    def _parse_rows(header, text):
+        """Parse CSV text (no header) into {column: float64 array} and a gpu name array."""
+        rows = list(csv.reader(io.StringIO(text)))
+        rows = [r for r in rows if r]
+        gpu_pos = header.index("gpu")
+        columns = {}
+        for pos, name in enumerate(header):
+            if pos != gpu_pos:
+                columns[name] = np.array([_to_float(r[pos]) if pos < len(r) else np.nan for r in rows],
+                                         dtype=np.float64)
+        gpus = np.array([r[gpu_pos] for r in rows], dtype=object)
+        return columns, gpus
+
+    def _load_full(self):
+        st = os.stat(self.path)  # before reading: rows written meanwhile show up as a change
+        with open(self.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        header_end = data.find(b"\n") + 1
+        if header_end == 0:
+            raise ValueError(f"{self.path} has no header line")
+        header = next(csv.reader([data[:header_end].decode("utf-8")]))
+        for name in ("config", "gpu", "powercap(w)"):
+            if name not in header:
+                raise ValueError(f"{self.path} has no '{name}' column (not a generate_dataset.py output?)")
+        columns, gpus = self._parse_rows(header, data[header_end:end].decode("utf-8"))
+        self.header_bytes = data[:header_end]
+        self._set_offset(st, end, data[:end])
+        self._publish(header, columns, gpus)
+        self.reloads["full"] += 1
+
+    def _set_offset(self, st, end, parsed):
+        """Remember the file state, where parsing stopped and the bytes just before it."""
+        self.stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self.offset = end
+        self.tail = parsed[-TAIL_CHECK_BYTES:]
+
+    def _publish(self, header, columns, gpus):
+        """Index rows per (gpu, powercap), sorted by config, and swap in the new view."""
+        config = columns["config"]
+        names, gpu_codes = np.unique(gpus.astype(str), return_inverse=True)
+        caps, cap_codes = np.unique(columns["powercap(w)"], return_inverse=True)
+        order = np.lexsort((config, cap_codes, gpu_codes))
+        index = {}
+        if len(order):
+            group = gpu_codes[order] * len(caps) + cap_codes[order]
+            for rows in np.split(order, np.flatnonzero(np.diff(group)) + 1):
+                key = (str(names[gpu_codes[rows[0]]]), float(caps[cap_codes[rows[0]]]))
+                index[key] = rows
+        version = self.view.version + 1 if self.view is not None else 1
+        self.view = DatasetView(header, columns, gpus, index, version)
+
+    def refresh(self):
+        """
+        Pick up changes of the CSV: parse only appended complete lines, or reload
+        in full if the file was rewritten. Returns the number of new rows (None
+        for a full reload, 0 if unchanged).
+        """
+        with self.lock:
+            st = os.stat(self.path)
+            if (st.st_ino, st.st_size, st.st_mtime_ns) == self.stat_key:
+                return 0
+            with open(self.path, "rb") as f:
+                head = f.read(len(self.header_bytes))
+                start = max(0, self.offset - len(self.tail))
+                f.seek(start)
+                data = f.read()
+            rewritten = (st.st_ino != self.stat_key[0] or st.st_size < self.offset
+                         or head != self.header_bytes or data[:len(self.tail)] != self.tail)
+            if rewritten:
+                self._load_full()
+                return None
+
+            view = self.view
+            appended = data[len(self.tail):]
+            end = appended.rfind(b"\n") + 1  # leave a partially written last line for later
+            columns, gpus = self._parse_rows(view.header, appended[:end].decode("utf-8"))
+            if len(gpus):
+                # New arrays: queries still holding the previous view keep consistent data
+                self._publish(view.header,
+                              {name: np.concatenate([view.columns[name], columns[name]]) for name in view.columns},
+                              np.concatenate([view.gpus, gpus]))
+                self.reloads["append"] += 1
+            self._set_offset(st, self.offset + end, data[:len(self.tail) + end])
+            return len(gpus)
+
+    @property
+    def features(self):
+        return [name for name in self.view.header if name not in KEY_COLUMNS]
+
+    def query(self, gpu=None, powercap=None, config_range=None, features=None):
+        """
+        Rows matching every given filter, ordered by (gpu, powercap, config).
+
+        Args:
+            gpu: list of GPU names, or None for all
+            powercap: list of power caps in watts, or None for all
+            config_range: inclusive (lo, hi) config index range, or None for all
+            features: list of feature columns to return, or None for all
+        Returns (columns, gpu_names, version): KEY_COLUMNS + features as float64
+        arrays, with the gpu column holding indices into gpu_names, all taken
+        from one view.
+        """
+        view = self.view
+        columns, gpus, index = view.columns, view.gpus, view.index
+        features = [name for name in view.header if name not in KEY_COLUMNS] if features is None else features
+        unknown = [name for name in features if name not in columns]
+        if unknown:
+            raise KeyError(f"unknown feature(s): {', '.join(unknown)}")
+
+        gpu_names = sorted({g for g, _ in index} if gpu is None else set(gpu))
+        caps = None if powercap is None else {float(w) for w in powercap}
+        parts = []
+        for key in sorted(index):
+            if key[0] not in gpu_names or (caps is not None and key[1] not in caps):
+                continue
+            rows = index[key]
+            if config_range is not None:
+                config = columns["config"][rows]
+                lo = np.searchsorted(config, config_range[0], side="left")
+                hi = np.searchsorted(config, config_range[1], side="right")
+                rows = rows[lo:hi]
+            parts.append(rows)
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+        codes = {name: i for i, name in enumerate(gpu_names)}
+        result = {
+            "config": columns["config"][rows],
+            "gpu": np.array([codes[g] for g in gpus[rows]], dtype=np.float64),
+            "powercap(w)": columns["powercap(w)"][rows],
+        }
+        for name in features:
+            result[name] = columns[name][rows]
+        return result, gpu_names, view.version
+
+    def info(self):
+        view = self.view
+        caps = {}
+        for g, w in view.index:
+            caps.setdefault(g, []).append(w)
+        return {
+            "path": self.path,
+            "rows": len(view.gpus),
+            "version": view.version,
+            "reloads": dict(self.reloads),
+            "columns": view.header,
+            "power_caps": {g: sorted(w) for g, w in sorted(caps.items())},
+        }
+
+
+def encode_frame(columns, gpu_names, version):
+    """Binary /query response: header length, JSON header, float64 column buffers."""
+    header = json.dumps({
+        "rows": len(columns["config"]),
+        "columns": list(columns),
+        "gpus": gpu_names,
+        "version": version,
+    }).encode("utf-8")
+    body = b"".join(np.ascontiguousarray(values, dtype="<f8").tobytes() for values in columns.values())
+    return struct.pack("<I", len(header)) + header + body
+
+
+def decode_frame(frame):
+    """Inverse of encode_frame: ({column: float64 array}, header dict)."""
+    (header_len,) = struct.unpack_from("<I", frame)
+    header = json.loads(frame[4:4 + header_len].decode("utf-8"))
+    rows = header["rows"]
+    columns = {}
+    offset = 4 + header_len
+    for name in header["columns"]:
+        columns[name] = np.frombuffer(frame, dtype="<f8", count=rows, offset=offset)
+        offset += rows * 8
+    return columns, header
+
+
+def _split(values):
+    """Comma-separated query parameter -> list (None if absent)."""
+    if not values:
+        return None
+    return [v for value in values for v in value.split(",") if v]
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """HTTP handler serving /query and /info from the server's DatasetIndex."""
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        dataset = self.server.dataset
+        try:
+            dataset.refresh()
+            if url.path == "/info":
+                self._send_json(200, dataset.info())
+                return
+            if url.path != "/query":
+                self._send_json(404, {"error": f"unknown path {url.path} (use /query or /info)"})
+                return
+
+            config = params.get("config")
+            columns, gpu_names, version = dataset.query(
+                gpu=_split(params.get("gpu")),
+                powercap=_split(params.get("powercap")),
+                config_range=parse_config_range(config[0]) if config else None,
+                features=_split(params.get("features")),
+            )
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e).strip("'\"")})
+            return
+
+        if params.get("format") == ["json"]:
+            self._send_json(200, {
+                "gpus": gpu_names,
+                "version": version,
+                "columns": {name: [None if np.isnan(v) else float(v) for v in values]
+                            for name, values in columns.items()},
+            })
+        else:
+            self._send(200, encode_frame(columns, gpu_names, version), "application/octet-stream")
+
+    def log_message(self, format, *args):
+        pass  # one line per request would swamp the console during training
+
+
+def serve(dataset_file, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    dataset = DatasetIndex(dataset_file)
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.dataset = dataset
+    info = dataset.info()
+    print(f"Loaded {info['rows']} row(s), {len(dataset.features)} feature column(s) from {dataset_file}")
+    print(f"Serving on http://{host}:{server.server_address[1]} (/query, /info), Ctrl-C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def fetch(gpu=None, powercap=None, config_range=None, features=None, url=DEFAULT_URL):
+    """
+    Query a running dataset server (arguments as DatasetIndex.query; a single
+    GPU name or power cap is accepted too). Returns (columns, header): float64
+    arrays with KEY_COLUMNS first, and the frame header whose "gpus" list maps
+    the gpu codes to names.
+    """
+    params = []
+    if gpu is not None:
+        params.append(("gpu", ",".join([gpu] if isinstance(gpu, str) else gpu)))
+    if powercap is not None:
+        params.append(("powercap", ",".join(str(w) for w in np.atleast_1d(powercap))))
+    if config_range is not None:
+        params.append(("config", f"{config_range[0]}-{config_range[1]}"))
+    if features is not None:
+        params.append(("features", ",".join(features)))
+    with urllib.request.urlopen(f"{url}/query?{urllib.parse.urlencode(params)}") as response:
+        return decode_frame(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local indexed query service for a generated dataset")
+    parser.add_argument("--url", type=str, default=DEFAULT_URL,
+                        help=f"Server URL for query/info (default: {DEFAULT_URL})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Load the dataset once and serve slice queries")
+    p_serve.add_argument("--dataset", "-d", type=str, default="dataset_feature.csv",
+                         help="Dataset CSV from generate_dataset.py (default: dataset_feature.csv)")
+    p_serve.add_argument("--host", type=str, default=DEFAULT_HOST,
+                         help=f"Bind address (default: {DEFAULT_HOST}, local only)")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT,
+                         help=f"Port (default: {DEFAULT_PORT})")
+
+    p_query = sub.add_parser("query", help="Fetch a slice from a running server")
+    p_query.add_argument("--gpu", type=str, default=None, help="GPU name(s), comma-separated (e.g. A100)")
+    p_query.add_argument("--powercap", type=str, default=None, help="Power cap(s) in watts, comma-separated")
+    p_query.add_argument("--config", type=str, default=None, help="Config index range, e.g. 0-99")
+    p_query.add_argument("--features", type=str, default=None, help="Feature columns, comma-separated")
+    p_query.add_argument("--output", "-o", type=str, default=None, help="Write the slice to this CSV")
+
+    sub.add_parser("info", help="Print rows, columns and power caps of a running server")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.dataset, args.host, args.port)
+        return 0
+
+    if args.command == "info":
+        with urllib.request.urlopen(f"{args.url}/info") as response:
+            print(json.dumps(json.load(response), indent=1))
+        return 0
+
+    columns, header = fetch(
+        gpu=args.gpu.split(",") if args.gpu else None,
+        powercap=args.powercap.split(",") if args.powercap else None,
+        config_range=parse_config_range(args.config) if args.config else None,
+        features=args.features.split(",") if args.features else None,
+        url=args.url,
+    )
+    print(f"{header['rows']} row(s), {len(columns)} column(s) (dataset version {header['version']})")
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(list(columns))
+            for i in range(header["rows"]):
+                row = [values[i] for values in columns.values()]
+                row[0], row[1] = int(row[0]), header["gpus"][int(row[1])]
+                writer.writerow(["" if isinstance(v, float) and np.isnan(v) else v for v in row])
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Vectorised derived-feature engine for the generated dataset.
+
+Adds a declared set of derived features to dataset_feature.csv (or
+dataset_timing.csv) in one batched NumPy pass over the whole table:
+  - conv FLOPs and ideal bytes moved from the workload shape of each row's sketch
+  - achieved GFLOP/s and arithmetic intensity
+  - energy efficiency relative to the power cap (GFLOP/s per W)
+  - time normalised by the median time of the row's GPU
+
+Workload args come from the sketch log (config index = line index), parsed the
+same way genkernel.py does.
+
+Usage:
+    python derived_features.py -d dataset_feature.csv -f allkernels.json
+    python generate_dataset.py --derived                # same, as a post-processing stage
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+from sketch_records import load_sketch_lines, parse_workload
+
+# Declared derived features: (column name, dtype, description), in output order
+DERIVED_FEATURES = [
+    ("conv_flops(g)", "float64", "2 * N * CO * OH * OW * CI * KH * KW, in GFLOP"),
+    ("bytes_moved(mb)", "float64", "Ideal fp32 traffic: input + weights + output, in MB"),
+    ("arith_intensity", "float64", "FLOPs per ideal byte moved"),
+    ("gflops", "float64", "Achieved GFLOP/s (conv FLOPs / time)"),
+    ("gflops_per_w", "float64", "Achieved GFLOP/s per watt of power cap"),
+    ("time_norm", "float64", "time(ms) / median time(ms) of the row's GPU"),
+]
+
+DERIVED_COLUMNS = [name for name, _, _ in DERIVED_FEATURES]
+
+# Workload args used per row, in the order of the shape matrix
+SHAPE_FIELDS = ["N", "H", "W", "CO", "CI", "KH", "KW", "stride", "padding"]
+
+
+def workload_table(log_file):
+    """
+    Parse every sketch of log_file into an int64 matrix of SHAPE_FIELDS,
+    one row per config index (line index).
+    """
+    rows = []
+    for line in load_sketch_lines(log_file):
+        w = parse_workload(line)
+        rows.append([w["N"], w["H"], w["W"], w["CO"], w["CI"], w["KH"], w["KW"],
+                     w["strides"][0], w["padding"][0]])
+    return np.asarray(rows, dtype=np.int64).reshape(-1, len(SHAPE_FIELDS))
+
+
+def _column(rows, name):
+    """Float64 array of a CSV column (empty cells -> NaN)."""
+    return np.array([float(r[name]) if r.get(name) not in (None, "") else np.nan for r in rows],
+                    dtype=np.float64)
+
+
+def compute_derived(shapes, time_ms, powercap_w, gpu):
+    """
+    Compute DERIVED_FEATURES for a whole table at once.
+
+    Args:
+        shapes: int64 array (rows, len(SHAPE_FIELDS)) of workload args per row
+        time_ms: float64 array of kernel times (NaN if missing)
+        powercap_w: float64 array of power caps (NaN if missing)
+        gpu: array of GPU names (used to group the time normalisation)
+    Returns a dict of column name -> float64 array.
+    """
+    N, H, W, CO, CI, KH, KW, stride, padding = shapes.T
+    OH = (H - KH + 2 * padding) // stride + 1
+    OW = (W - KW + 2 * padding) // stride + 1
+
+    flops = 2.0 * N * CO * OH * OW * CI * KH * KW
+    bytes_moved = 4.0 * (N * CI * H * W + CO * CI * KH * KW + N * CO * OH * OW)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gflops = flops / (time_ms * 1e-3) / 1e9
+        gflops_per_w = gflops / powercap_w
+
+        # Per-GPU median time: one nanmedian per GPU, scattered back with the inverse index
+        names, inverse = np.unique(gpu, return_inverse=True)
+        medians = np.array([np.nanmedian(time_ms[inverse == g]) if np.any(~np.isnan(time_ms[inverse == g]))
+                            else np.nan for g in range(len(names))])
+        time_norm = time_ms / medians[inverse]
+
+    derived = {
+        "conv_flops(g)": flops / 1e9,
+        "bytes_moved(mb)": bytes_moved / 1e6,
+        "arith_intensity": flops / bytes_moved,
+        "gflops": gflops,
+        "gflops_per_w": gflops_per_w,
+        "time_norm": time_norm,
+    }
+    return {name: derived[name].astype(dtype) for name, dtype, _ in DERIVED_FEATURES}
+
+
+def add_derived_features(dataset_file, log_file, output_file=None):
+    """
+    Append DERIVED_COLUMNS to dataset_file (in place unless output_file is given).
+    Returns the number of rows processed.
+    """
+    with open(dataset_file, newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = [c for c in reader.fieldnames if c not in DERIVED_COLUMNS]
+        rows = list(reader)
+    if not rows:
+        print(f"No rows in {dataset_file}, skipping derived features")
+        return 0
+
+    table = workload_table(log_file)
+    config_idx = np.array([int(r["config"]) for r in rows], dtype=np.int64)
+    unknown = config_idx >= len(table)
+    if np.any(unknown):
+        raise ValueError(f"config {int(config_idx[unknown][0])} not in {log_file} "
+                         f"({len(table)} sketches)")
+
+    derived = compute_derived(
+        table[config_idx],
+        _column(rows, "time(ms)"),
+        _column(rows, "powercap(w)"),
+        np.array([r["gpu"] for r in rows]),
+    )
+
+    output_file = output_file or dataset_file
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames + DERIVED_COLUMNS)
+        values = np.column_stack([derived[name] for name in DERIVED_COLUMNS])
+        for row, extra in zip(rows, values):
+            writer.writerow([row[c] for c in fieldnames]
+                            + ["" if np.isnan(v) else float(v) for v in extra])
+    os.replace(tmp_path, output_file)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add derived features to a generated dataset")
+    parser.add_argument("--dataset", "-d", type=str, default="dataset_feature.csv",
+                        help="Dataset CSV from generate_dataset.py (default: dataset_feature.csv)")
+    parser.add_argument("--log-file", "-f", type=str, default="allkernels.json",
+                        help="Sketch JSON file the dataset was generated from (default: allkernels.json)")
+    parser.add_argument("--output", "-o", type=str, default=None,
+                        help="Output CSV (default: rewrite the dataset in place)")
+    args = parser.parse_args()
+
+    processed = add_derived_features(args.dataset, args.log_file, args.output)
+    print(f"Derived features ({', '.join(DERIVED_COLUMNS)}) added to {processed} row(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Device limits used to validate generated kernels.
+
+verify_gpu_code only checks per-block limits. For the kernels TVM generates,
+those are the same on every supported architecture (sm_70 to sm_89):
+  - 1024 threads per block (1024 x 1024 x 64 per dimension)
+  - 48 KB of shared memory per block: TVM emits static __shared__ arrays, and
+    nvcc caps static shared memory at 48 KB even where dynamic shared memory
+    can be raised with an opt-in (96 KB on sm_70, 163 KB on sm_80, 99 KB on
+    sm_86/89)
+  - 16-byte vector loads/stores
+What does differ per architecture (shared memory, registers and threads per
+SM) only affects occupancy, not validity, so no per-GPU table is kept. Verdicts
+are cached per limits (limits_key via validate_sketches.verdict_key), not per
+architecture, so a record is verified once for all of them; an architecture with
+other per-block limits would get its own key.
+"""
+import hashlib
+import json
+
+# Limits passed to tvm.tir.analysis.verify_gpu_code
+VERIFY_LIMITS = {
+    "max_shared_memory_per_block": 48 * 1024,
+    "max_threads_per_block": 1024,
+    "max_thread_x": 1024,
+    "max_thread_y": 1024,
+    "max_thread_z": 64,
+    "max_vector_bytes": 16,
+}
+
+# Architectures the limits above were checked against
+SUPPORTED_ARCHS = ["sm_70", "sm_75", "sm_80", "sm_86", "sm_89"]
+
+# Used when a record's target does not name an architecture
+DEFAULT_ARCH = "sm_86"
+
+
+def normalize_arch(arch):
+    """Normalize '80' / 'sm_80' to 'sm_80'; None maps to DEFAULT_ARCH."""
+    if not arch:
+        return DEFAULT_ARCH
+    arch = str(arch)
+    return arch if arch.startswith("sm_") else f"sm_{arch}"
+
+
+_warned_archs = set()
+
+
+def verify_limits(arch):
+    """
+    Return the verify_gpu_code limits of an architecture ('sm_80' or '80').
+    Architectures outside SUPPORTED_ARCHS get the same limits, with a warning (once).
+    """
+    arch = normalize_arch(arch)
+    if arch not in SUPPORTED_ARCHS and arch not in _warned_archs:
+        _warned_archs.add(arch)
+        print(f"Warning: Limits not checked for '{arch}', using the {', '.join(SUPPORTED_ARCHS)} limits")
+    return VERIFY_LIMITS
+
+
+def limits_key(arch):
+    """Short stable identifier of an architecture's verify limits (equal limits, equal key)."""
+    canonical = json.dumps(verify_limits(arch), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:8]
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import csv
+import gzip
+import io
 import sys
 
 # Mapping from original Nsight Compute metric name
@@ -29,6 +31,30 @@ METRIC_TRANSFORMS = {
 
 WANTED_METRICS = list(METRIC_TRANSFORMS.keys())
 
+# Suffixes of NCU exports understood by open_ncu_export()
+NCU_EXPORT_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
+
+
+def open_ncu_export(csv_path: str):
+    """
+    Open an Nsight Compute CSV export as a text stream.
+    Plain '.csv', gzip '.csv.gz' and zstd '.csv.zst' files are supported;
+    zstd requires the optional 'zstandard' package.
+    """
+    if csv_path.endswith(".gz"):
+        return gzip.open(csv_path, "rt", newline="", encoding="utf-8", errors="ignore")
+    if csv_path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError(
+                f"Reading {csv_path} requires the 'zstandard' package (pip install zstandard)"
+            )
+        raw = open(csv_path, "rb")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, newline="", encoding="utf-8", errors="ignore")
+    return open(csv_path, newline="", encoding="utf-8", errors="ignore")
+
 
 def clean_numeric(value_str: str):
     """
@@ -53,24 +79,30 @@ def clean_numeric(value_str: str):
 
 def extract_and_transform_metrics(csv_path: str):
     """
-    Read an Nsight Compute CSV export, extract the wanted metrics,
-    apply unit conversions, and return a dict:
+    Read an Nsight Compute CSV export (plain, gzip or zstd), extract the
+    wanted metrics, apply unit conversions, and return a dict:
         { new_feature_name: scaled_value, ... }
     """
     raw_results = {name: None for name in WANTED_METRICS}
 
-    with open(csv_path, newline="", encoding="utf-8", errors="ignore") as f:
+    with open_ncu_export(csv_path) as f:
         # Skip profiler banner lines like "==PROF== ..."
         filtered_lines = (
             line for line in f if not line.lstrip().startswith("==PROF==")
         )
 
         reader = csv.DictReader(filtered_lines)
+        remaining = len(raw_results)
         for row in reader:
             name = row.get("Metric Name")
             if name in raw_results and raw_results[name] is None:
                 raw_val = row.get("Metric Value")
                 raw_results[name] = clean_numeric(raw_val)
+                if raw_results[name] is not None:
+                    remaining -= 1
+                # Stop as soon as every wanted metric has been found
+                if remaining == 0:
+                    break
 
     # Apply renaming and scaling
     transformed = {}
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Keyed feature store for profiling datasets.
+
+Joins three sources into one SQLite database:
+  - sketch records (workload, schedule features, TVM-measured cost from the "r" field)
+  - NCU features from dataset_feature.csv (one row per config per power cap)
+  - the GPU the dataset was collected on
+
+Profiles are keyed by (sketch_hash, gpu, powercap_w), so datasets from different
+GPUs (allkernels.json.A100, .RTX3090, .RTX4090, .V100) can be merged and sliced
+without re-scanning raw CSVs.
+
+Usage:
+    python feature_store.py ingest -f allkernels.json.A100 -d dataset_feature.csv
+    python feature_store.py query --gpu A100 --powercap 250 -o slice.csv
+    python feature_store.py stats
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+
+from sketch_records import (
+    load_sketch_lines,
+    measured_cost,
+    parse_workload,
+    schedule_features,
+    sketch_hash,
+    target_string,
+    workload_key,
+)
+
+# Default database file
+STORE_FILE = "feature_store.db"
+
+# Dataset identifier columns (everything else in dataset_feature.csv is a feature)
+DATASET_KEY_COLUMNS = ["id", "config", "gpu", "powercap(w)"]
+
+# CUDA-event timing datasets (generate_dataset.py --timing-dir) are recognised by this
+# column; their features are stored with TIMING_PREFIX so that e.g. the event-timed
+# 'time(ms)' becomes 'event_time(ms)' and never overwrites the NCU 'time(ms)'
+TIMING_MARKER_COLUMN = "timed_runs"
+TIMING_PREFIX = "event_"
+
+# Sketch columns stored alongside each record
+SKETCH_COLUMNS = [
+    "workload", "target", "cost_s",
+    "N", "H", "W", "CO", "CI", "KH", "KW", "stride", "padding",
+    "grid", "block", "num_steps", "unroll_max_step", "shared_stages",
+]
+
+
+def _quote(name):
+    """Quote a column name such as 'time(ms)' for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def open_store(path=STORE_FILE):
+    """
+    Open (and create if needed) the feature store database.
+    """
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sketches (
+            sketch_hash TEXT PRIMARY KEY,
+            workload TEXT, target TEXT, record TEXT, cost_s REAL,
+            N INTEGER, H INTEGER, W INTEGER, CO INTEGER, CI INTEGER,
+            KH INTEGER, KW INTEGER, stride INTEGER, padding INTEGER,
+            grid INTEGER, block INTEGER, num_steps INTEGER,
+            unroll_max_step INTEGER, shared_stages INTEGER
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS profiles (
+            sketch_hash TEXT NOT NULL REFERENCES sketches(sketch_hash),
+            gpu TEXT NOT NULL,
+            powercap_w REAL NOT NULL,
+            config_idx INTEGER,
+            source_log TEXT,
+            features TEXT NOT NULL,
+            PRIMARY KEY (sketch_hash, gpu, powercap_w)
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_gpu_cap ON profiles (gpu, powercap_w)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_config ON profiles (source_log, config_idx)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sketches_workload ON sketches (workload)")
+    return conn
+
+
+def ingest_sketches(conn, log_file):
+    """
+    Insert every sketch of log_file into the store.
+    Returns a list mapping config index (line index) -> sketch hash.
+    """
+    hashes = []
+    for line in load_sketch_lines(log_file):
+        record = json.loads(line)
+        key = sketch_hash(record)
+        workload = parse_workload(record)
+        sched = schedule_features(record)
+        conn.execute(
+            "INSERT OR REPLACE INTO sketches VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, workload_key(record), target_string(record), line.strip(),
+                measured_cost(record),
+                workload["N"], workload["H"], workload["W"], workload["CO"],
+                workload["CI"], workload["KH"], workload["KW"],
+                workload["strides"][0], workload["padding"][0],
+                sched["grid"], sched["block"], sched["num_steps"],
+                sched["unroll_max_step"], sched["shared_stages"],
+            ),
+        )
+        hashes.append(key)
+    conn.commit()
+    return hashes
+
+
+def ingest_dataset(conn, log_file, dataset_file):
+    """
+    Ingest a dataset_feature.csv (or dataset_timing.csv) produced from log_file.
+    Rows are linked to sketches through their 'config' column (line index in log_file);
+    features of rows already in the store are merged, new values winning. Timing dataset
+    features are renamed with TIMING_PREFIX so they sit next to the NCU features.
+    Returns the number of profile rows stored.
+    """
+    hashes = ingest_sketches(conn, log_file)
+    stored = 0
+
+    with open(dataset_file, newline="") as f:
+        reader = csv.DictReader(f)
+        prefix = TIMING_PREFIX if TIMING_MARKER_COLUMN in (reader.fieldnames or []) else ""
+        for row in reader:
+            config_idx = int(row["config"])
+            if config_idx >= len(hashes):
+                print(f"Warning: config {config_idx} not in {log_file} "
+                      f"({len(hashes)} sketches), skipping")
+                continue
+            if not row["gpu"] or not row["powercap(w)"]:
+                print(f"Warning: row id={row['id']} has no GPU/power cap, skipping")
+                continue
+
+            key = (hashes[config_idx], row["gpu"], float(row["powercap(w)"]))
+            features = {
+                prefix + name: _parse_value(value)
+                for name, value in row.items()
+                if name not in DATASET_KEY_COLUMNS
+            }
+            # Merge with features already stored for this key (e.g. NCU + CUDA-event timing datasets)
+            existing = conn.execute(
+                "SELECT features FROM profiles WHERE sketch_hash = ? AND gpu = ? AND powercap_w = ?", key
+            ).fetchone()
+            if existing is not None:
+                features = {**json.loads(existing["features"]), **features}
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?)",
+                key + (config_idx, log_file, json.dumps(features)),
+            )
+            stored += 1
+
+    conn.commit()
+    return stored
+
+
+def _parse_value(value):
+    """Convert a CSV cell back to float where possible (empty -> None)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def query(conn, gpu=None, powercap=None, workload=None, features=None):
+    """
+    Return joined rows (sketch columns + NCU features) as a list of dicts.
+
+    Args:
+        gpu: GPU name filter (e.g. "A100"), or None for all
+        powercap: power cap in watts, or None for all
+        workload: workload key filter, or None for all
+        features: list of feature names to keep, or None for all
+    """
+    clauses = []
+    params = []
+    if gpu is not None:
+        clauses.append("p.gpu = ?")
+        params.append(gpu)
+    if powercap is not None:
+        clauses.append("p.powercap_w = ?")
+        params.append(float(powercap))
+    if workload is not None:
+        clauses.append("s.workload = ?")
+        params.append(workload)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    sql = (
+        "SELECT p.sketch_hash, p.gpu, p.powercap_w, p.config_idx, p.source_log, p.features, "
+        + ", ".join("s." + _quote(c) for c in SKETCH_COLUMNS)
+        + " FROM profiles p JOIN sketches s ON p.sketch_hash = s.sketch_hash "
+        + where
+        + " ORDER BY p.gpu, p.source_log, p.config_idx, p.powercap_w"
+    )
+
+    rows = []
+    for r in conn.execute(sql, params):
+        out = {k: r[k] for k in r.keys() if k != "features"}
+        stored = json.loads(r["features"])
+        if features is None:
+            out.update(stored)
+        else:
+            out.update({name: stored.get(name) for name in features})
+        rows.append(out)
+    return rows
+
+
+def write_rows(rows, output_file):
+    """Write query() results to a CSV file."""
+    if not rows:
+        print("No rows matched the query")
+        return
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Wrote {len(rows)} row(s) to {output_file}")
+
+
+def print_stats(conn):
+    """Print row counts per (gpu, power cap)."""
+    num_sketches = conn.execute("SELECT COUNT(*) FROM sketches").fetchone()[0]
+    print(f"Sketches: {num_sketches}")
+    print("Profiles per GPU / power cap:")
+    for r in conn.execute(
+        "SELECT gpu, powercap_w, COUNT(*) AS n FROM profiles "
+        "GROUP BY gpu, powercap_w ORDER BY gpu, powercap_w"
+    ):
+        print(f"  {r['gpu']:>10} {r['powercap_w']:>7.0f}W  {r['n']} row(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyed feature store for profiling datasets")
+    parser.add_argument("--store", "-s", type=str, default=STORE_FILE,
+                        help=f"Feature store database (default: {STORE_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="Ingest a sketch log and its dataset CSV")
+    p_ingest.add_argument("--log-file", "-f", type=str, default="allkernels.json",
+                          help="Sketch JSON file the dataset was generated from")
+    p_ingest.add_argument("--dataset", "-d", type=str, default="dataset_feature.csv",
+                          help="Dataset CSV from generate_dataset.py")
+
+    p_query = sub.add_parser("query", help="Export a slice of the store to CSV")
+    p_query.add_argument("--gpu", type=str, default=None)
+    p_query.add_argument("--powercap", type=float, default=None)
+    p_query.add_argument("--workload", type=str, default=None)
+    p_query.add_argument("--features", type=str, default=None,
+                         help="Comma-separated feature names (default: all)")
+    p_query.add_argument("--output", "-o", type=str, required=True)
+
+    sub.add_parser("stats", help="Print store statistics")
+
+    args = parser.parse_args()
+    conn = open_store(args.store)
+
+    if args.command == "ingest":
+        stored = ingest_dataset(conn, args.log_file, args.dataset)
+        print(f"Ingested {stored} profile row(s) from {args.dataset} into {args.store}")
+    elif args.command == "query":
+        features = args.features.split(",") if args.features else None
+        rows = query(conn, gpu=args.gpu, powercap=args.powercap,
+                     workload=args.workload, features=features)
+        write_rows(rows, args.output)
+    elif args.command == "stats":
+        print_stats(conn)
+
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,13 @@ Uses the metric extraction logic from extract_ncu_metrics.py.
 """
 import os
 import csv
+import json
 import re
-import subprocess
+import argparse
 from pathlib import Path
-from extract_ncu_metrics import extract_and_transform_metrics
+from extract_ncu_metrics import extract_and_transform_metrics, NCU_EXPORT_SUFFIXES
+from hardware_info import POWER_CAP_CONFIGS, detect_gpu_type
+from telemetry import TELEMETRY_COLUMNS
 
 # Output CSV file
 OUTPUT_FILE = "dataset_feature.csv"
@@ -18,15 +21,15 @@ OUTPUT_FILE = "dataset_feature.csv"
 # NCU results directory
 NCU_RESULTS_DIR = "ncu_results"
 
-# Power cap settings for different GPU types
-# Note: A30 has 3 settings, others have 5 settings
-POWER_CAP_CONFIGS = {
-    "RTX 3090": [100, 200, 300, 400, 450],
-    "RTX 4090": [150, 200, 300, 400, 450],
-    "A30": [100, 130, 165],
-    "V100": [100, 150, 200, 250, 300],
-    "A100": [100, 200, 250, 300, 400],
-}
+# CUDA-event timing results (written by time.sh) and their dataset
+TIMING_RESULTS_DIR = "timing_results"
+TIMING_OUTPUT_FILE = "dataset_timing.csv"
+
+# Timing dataset columns: time(ms) is the median, matching the NCU dataset's label name
+TIMING_COLUMNS = ["time(ms)", "time_min(ms)", "time_p90(ms)", "time_mean(ms)", "timed_runs"]
+
+# Manifest of rows derived rather than profiled (written by adaptive_profile.py)
+DERIVED_MANIFEST = "derived.json"
 
 # Column order (must match the feature names from extract_ncu_metrics.py)
 FEATURE_COLUMNS = [
@@ -48,38 +51,13 @@ FEATURE_COLUMNS = [
 ]
 
 
-def detect_gpu_type():
-    """
-    Detect the GPU type using nvidia-smi.
-    Returns the GPU type string that matches POWER_CAP_CONFIGS keys.
-    """
-    try:
-        result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=name", "--format=csv,noheader", "-i", "0"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        gpu_name = result.stdout.strip()
-
-        # Match against known GPU types
-        for gpu_type in POWER_CAP_CONFIGS.keys():
-            if gpu_type in gpu_name:
-                return gpu_type
-
-        print(f"Warning: Unknown GPU '{gpu_name}'. Cannot determine power cap values.")
-        return None
-    except Exception as e:
-        print(f"Warning: Could not detect GPU type: {e}")
-        return None
-
-
 def extract_config_id(filename):
     """
     Extract the configuration index from filename like 'ncu_config_123.csv'
+    (also 'ncu_config_123.csv.gz' / 'ncu_config_123.csv.zst').
     Returns the index as an integer, or None if pattern doesn't match.
     """
-    match = re.search(r'ncu_config_(\d+)\.csv', filename)
+    match = re.search(r'ncu_config_(\d+)\.csv(\.gz|\.zst)?$', filename)
     if match:
         return int(match.group(1))
     return None
@@ -100,14 +78,16 @@ def extract_powercap_idx(dirname):
 def collect_ncu_files(directory):
     """
     Scan the directory for all ncu_config_*.csv files in powercap subdirectories.
+    Compressed exports (ncu_config_*.csv.gz / .csv.zst, see compress_ncu_results.py)
+    are picked up too; if several variants of one export exist, the plain CSV wins.
     Returns a sorted list of (config_idx, powercap_idx, filepath) tuples.
     Sorted by (config_idx, powercap_idx) for proper sequential ID assignment.
     """
-    results = []
+    found = {}
 
     if not os.path.isdir(directory):
         print(f"Warning: Directory '{directory}' does not exist.")
-        return results
+        return []
 
     # Scan for powercap subdirectories
     for subdir_name in os.listdir(directory):
@@ -121,22 +101,68 @@ def collect_ncu_files(directory):
 
             # Scan for NCU CSV files in this subdirectory
             for filename in os.listdir(subdir_path):
-                if filename.startswith("ncu_config_") and filename.endswith(".csv"):
+                if filename.startswith("ncu_config_") and filename.endswith(NCU_EXPORT_SUFFIXES):
                     config_idx = extract_config_id(filename)
                     if config_idx is not None:
                         filepath = os.path.join(subdir_path, filename)
-                        results.append((config_idx, powercap_idx, filepath))
+                        key = (config_idx, powercap_idx)
+                        if key not in found or filename.endswith(".csv"):
+                            found[key] = filepath
 
     # Sort by (config_idx, powercap_idx) to maintain order:
     # config_0 at all powercaps, then config_1 at all powercaps, etc.
+    results = [(c, p, path) for (c, p), path in found.items()]
     results.sort(key=lambda x: (x[0], x[1]))
     return results
 
 
-def generate_dataset(output_file=OUTPUT_FILE, ncu_dir=NCU_RESULTS_DIR):
+def load_derived_manifest(ncu_dir):
     """
-    Generate dataset_feature.csv from all NCU CSV files in powercap subdirectories.
-    Includes power cap index and wattage for each configuration.
+    Return the set of (config_idx, powercap_idx) rows that adaptive_profile.py
+    derived from another power cap instead of profiling.
+    """
+    path = os.path.join(ncu_dir, DERIVED_MANIFEST)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        manifest = json.load(f)
+    return {(entry["config"], entry["powercap_idx"]) for entry in manifest["derived"]}
+
+
+def collect_telemetry(directory):
+    """
+    Load the telemetry summaries (telemetry_config_<idx>.json, written by
+    telemetry.py record) of every powercap subdirectory.
+    Returns {(config_idx, powercap_idx): summary dict}.
+    """
+    summaries = {}
+    if not os.path.isdir(directory):
+        return summaries
+
+    for subdir_name in os.listdir(directory):
+        subdir_path = os.path.join(directory, subdir_name)
+        if os.path.isdir(subdir_path) and subdir_name.startswith("powercap"):
+            powercap_idx = extract_powercap_idx(subdir_name)
+            if powercap_idx is None:
+                continue
+            for filename in os.listdir(subdir_path):
+                match = re.fullmatch(r'telemetry_config_(\d+)\.json', filename)
+                if match:
+                    with open(os.path.join(subdir_path, filename)) as f:
+                        summaries[(int(match.group(1)), powercap_idx)] = json.load(f)["summary"]
+    return summaries
+
+
+def telemetry_values(telemetry, config_idx, powercap_idx):
+    """TELEMETRY_COLUMNS values of one row (empty cells if it has no telemetry)."""
+    summary = telemetry.get((config_idx, powercap_idx), {})
+    return [summary.get(column) for column in TELEMETRY_COLUMNS]
+
+
+def resolve_gpu_power_caps():
+    """
+    Detect the GPU and return (gpu_type, gpu_name, power_caps), where gpu_name is
+    the dataset label without spaces (e.g. "RTX 3090" -> "RTX3090").
     """
     # Detect GPU type to get power cap values
     gpu_type = detect_gpu_type()
@@ -153,6 +179,28 @@ def generate_dataset(output_file=OUTPUT_FILE, ncu_dir=NCU_RESULTS_DIR):
         power_caps = [None, None, None, None, None]
 
     print()
+    return gpu_type, gpu_name, power_caps
+
+
+def powercap_wattage(gpu_type, power_caps, powercap_idx):
+    """
+    Get actual power cap wattage with bounds checking
+    (A30 has 3 settings, other GPUs have 5 settings).
+    """
+    if gpu_type and powercap_idx - 1 < len(power_caps):
+        return power_caps[powercap_idx - 1]
+    if gpu_type:
+        print(f"Warning: powercap index {powercap_idx} out of range for {gpu_type} "
+              f"(only {len(power_caps)} power cap settings configured)")
+    return None
+
+
+def generate_dataset(output_file=OUTPUT_FILE, ncu_dir=NCU_RESULTS_DIR):
+    """
+    Generate dataset_feature.csv from all NCU CSV files in powercap subdirectories.
+    Includes power cap index and wattage for each configuration.
+    """
+    gpu_type, gpu_name, power_caps = resolve_gpu_power_caps()
 
     # Collect all NCU files from powercap subdirectories
     ncu_files = collect_ncu_files(ncu_dir)
@@ -162,40 +210,46 @@ def generate_dataset(output_file=OUTPUT_FILE, ncu_dir=NCU_RESULTS_DIR):
         return
 
     print(f"Found {len(ncu_files)} NCU profiling result(s)")
+    derived_rows = load_derived_manifest(ncu_dir)
+    if derived_rows:
+        print(f"{len(derived_rows)} row(s) derived by adaptive profiling (derived=1)")
+    telemetry = collect_telemetry(ncu_dir)
+    if telemetry:
+        print(f"{len(telemetry)} row(s) with power/clock telemetry")
     print()
 
     # Open output CSV file
     with open(output_file, 'w', newline='') as f:
         writer = csv.writer(f)
 
-        # Write header: [id, gpu, powercap(w), features...]
-        header = ["id", "gpu", "powercap(w)"] + FEATURE_COLUMNS
+        # Write header: [id, config, gpu, powercap(w), features..., derived, (telemetry...)]
+        # 'config' is the line index in the sketch log, linking each row back to its sketch
+        # 'derived' is 1 for rows copied from another power cap by adaptive_profile.py
+        # Telemetry columns (measured power/clocks, see telemetry.py) only if any was recorded
+        header = ["id", "config", "gpu", "powercap(w)"] + FEATURE_COLUMNS + ["derived"]
+        if telemetry:
+            header += TELEMETRY_COLUMNS
         writer.writerow(header)
 
         # Process each NCU file with sequential ID
         sequential_id = 1
         for config_idx, powercap_idx, filepath in ncu_files:
-            # Get actual power cap wattage with bounds checking
-            # (A30 has 3 settings, other GPUs have 5 settings)
-            if gpu_type and powercap_idx - 1 < len(power_caps):
-                powercap_watts = power_caps[powercap_idx - 1]
-            else:
-                powercap_watts = None
-                if gpu_type:
-                    print(f"Warning: powercap index {powercap_idx} out of range for {gpu_type} "
-                          f"(only {len(power_caps)} power cap settings configured)")
-
-            print(f"Processing: powercap{powercap_idx}/ncu_config_{config_idx}.csv "
+            powercap_watts = powercap_wattage(gpu_type, power_caps, powercap_idx)
+
+            print(f"Processing: powercap{powercap_idx}/{os.path.basename(filepath)} "
                   f"(id={sequential_id}, config={config_idx}, GPU={gpu_name}, powercap={powercap_watts}W)")
 
             # Extract metrics
             metrics = extract_and_transform_metrics(filepath)
 
-            # Build row: [sequential_id, GPU, powercap_watts, feature1, feature2, ...]
-            row = [sequential_id, gpu_name, powercap_watts]
+            # Build row: [sequential_id, config_idx, GPU, powercap_watts, feature1, feature2, ...]
+            row = [sequential_id, config_idx, gpu_name, powercap_watts]
             for feature_name in FEATURE_COLUMNS:
                 value = metrics.get(feature_name)
                 row.append(value)
+            row.append(1 if (config_idx, powercap_idx) in derived_rows else 0)
+            if telemetry:
+                row += telemetry_values(telemetry, config_idx, powercap_idx)
 
             # Write row
             writer.writerow(row)
@@ -205,11 +259,112 @@ def generate_dataset(output_file=OUTPUT_FILE, ncu_dir=NCU_RESULTS_DIR):
 
     print(f"\nDataset generated: {output_file}")
     print(f"Total rows: {len(ncu_files)} (+ 1 header)")
-    print(f"Columns: id, GPU, powercap(w), {len(FEATURE_COLUMNS)} features")
+    print(f"Columns: id, config, GPU, powercap(w), {len(FEATURE_COLUMNS)} features, derived"
+          + (f", {len(TELEMETRY_COLUMNS)} telemetry" if telemetry else ""))
+
+
+def collect_timing_files(directory):
+    """
+    Scan the directory for all timing_config_*.json files (written by time.sh)
+    in powercap subdirectories.
+    Returns a list of (config_idx, powercap_idx, filepath) sorted like collect_ncu_files.
+    """
+    results = []
+
+    if not os.path.isdir(directory):
+        print(f"Warning: Directory '{directory}' does not exist.")
+        return results
+
+    for subdir_name in os.listdir(directory):
+        subdir_path = os.path.join(directory, subdir_name)
+        if os.path.isdir(subdir_path) and subdir_name.startswith("powercap"):
+            powercap_idx = extract_powercap_idx(subdir_name)
+            if powercap_idx is None:
+                continue
+            for filename in os.listdir(subdir_path):
+                match = re.fullmatch(r'timing_config_(\d+)\.json', filename)
+                if match:
+                    results.append((int(match.group(1)), powercap_idx, os.path.join(subdir_path, filename)))
+
+    results.sort(key=lambda x: (x[0], x[1]))
+    return results
+
+
+def generate_timing_dataset(output_file=TIMING_OUTPUT_FILE, timing_dir=TIMING_RESULTS_DIR):
+    """
+    Generate dataset_timing.csv from CUDA-event timing results (time.sh).
+    Uses the same identifier columns as dataset_feature.csv; time(ms) is the median latency.
+    """
+    gpu_type, gpu_name, power_caps = resolve_gpu_power_caps()
+
+    timing_files = collect_timing_files(timing_dir)
+    if not timing_files:
+        print(f"No timing files found in '{timing_dir}/powercap*/' subdirectories")
+        return
+
+    print(f"Found {len(timing_files)} timing result(s)")
+    telemetry = collect_telemetry(timing_dir)
+
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "config", "gpu", "powercap(w)"] + TIMING_COLUMNS
+                        + (TELEMETRY_COLUMNS if telemetry else []))
+
+        for sequential_id, (config_idx, powercap_idx, filepath) in enumerate(timing_files, start=1):
+            powercap_watts = powercap_wattage(gpu_type, power_caps, powercap_idx)
+            with open(filepath) as tf:
+                timing = json.load(tf)
+            row = [
+                sequential_id, config_idx, gpu_name, powercap_watts,
+                timing["median_ms"], timing["min_ms"], timing["p90_ms"], timing["mean_ms"],
+                timing["repeat"],
+            ]
+            if telemetry:
+                row += telemetry_values(telemetry, config_idx, powercap_idx)
+            writer.writerow(row)
+
+    print(f"\nTiming dataset generated: {output_file}")
+    print(f"Total rows: {len(timing_files)} (+ 1 header)")
 
 
 def main():
-    generate_dataset()
+    parser = argparse.ArgumentParser(description='Generate dataset_feature.csv from NCU profiling results')
+    parser.add_argument('--output', '-o', type=str, default=OUTPUT_FILE,
+                        help=f'Output dataset CSV (default: {OUTPUT_FILE})')
+    parser.add_argument('--ncu-dir', type=str, default=NCU_RESULTS_DIR,
+                        help=f'NCU results directory (default: {NCU_RESULTS_DIR})')
+    parser.add_argument('--log-file', '-f', type=str, default='allkernels.json',
+                        help='Sketch JSON file the kernels were generated from (default: allkernels.json)')
+    parser.add_argument('--feature-store', type=str, default=None,
+                        help='Also ingest the dataset into this feature store database')
+    parser.add_argument('--timing-dir', type=str, default=None,
+                        help=f'Ingest CUDA-event timing results (e.g. {TIMING_RESULTS_DIR}) instead of NCU results')
+    parser.add_argument('--timing-output', type=str, default=TIMING_OUTPUT_FILE,
+                        help=f'Output timing dataset CSV (default: {TIMING_OUTPUT_FILE})')
+    parser.add_argument('--derived', action='store_true',
+                        help='Append derived features (FLOPs, GFLOP/s, intensity, ...) computed from the sketch log')
+    args = parser.parse_args()
+
+    if args.timing_dir:
+        generate_timing_dataset(output_file=args.timing_output, timing_dir=args.timing_dir)
+        args.output = args.timing_output
+    else:
+        generate_dataset(output_file=args.output, ncu_dir=args.ncu_dir)
+
+    if args.derived and os.path.exists(args.output):
+        from derived_features import add_derived_features, DERIVED_COLUMNS
+        processed = add_derived_features(args.output, args.log_file)
+        print(f"Derived features: {', '.join(DERIVED_COLUMNS)} added to {processed} row(s)")
+
+    if args.feature_store:
+        from feature_store import open_store, ingest_dataset
+        if not os.path.exists(args.output):
+            print(f"Warning: {args.output} not generated, skipping feature store ingestion")
+            return
+        conn = open_store(args.feature_store)
+        stored = ingest_dataset(conn, args.log_file, args.output)
+        conn.close()
+        print(f"Feature store: {stored} row(s) ingested into {args.feature_store}")
 
 
 if __name__ == "__main__":
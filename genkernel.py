@@ -1,14 +1,15 @@
-import numpy as np
 import tvm
-from tvm import te, auto_scheduler, topi
-from tvm.auto_scheduler.measure_record import load_record_from_string
 import json
-from tvm import te
-from tvm import topi
 import tvm.testing
 import tvm.topi.testing
 import os
 import argparse
+from device_profiles import normalize_arch
+from sketch_records import WORKLOAD_FIELDS, launch_dims, load_sketch_lines, parse_workload, schedule_key
+from tvm_workloads import apply_sketch
+from validate_sketches import (
+    VALIDATION_CACHE, load_verdicts, record_arch, rejection_reason, save_verdicts, verdict_key, verify_primfunc,
+)
 
 def get_verify_pass(valid, **kwargs):
     print(kwargs)
@@ -19,37 +20,60 @@ def get_verify_pass(valid, **kwargs):
 
     return tvm.tir.transform.prim_func_pass(_fverify, opt_level=0)
 
-def extract_values_from_json(line):
-    # print(f"line: {line}")
-    data = json.loads(line)
-    value_str = data['i'][0][0]
-    value_list = json.loads(value_str)
-    pz = value_list[1:]
-    # print(f"pz: {pz}")
-    return pz
-
-@auto_scheduler.register_workload
-def conv2d(N, H, W, CO, CI, KH, KW, stride, padding):
-    data = te.placeholder((N, CI, H, W), name="data")
-    kernel = te.placeholder((CO, CI, KH, KW), name="kernel")
-    conv = topi.nn.conv2d_nchw(data, kernel, stride, padding, dilation=1, out_dtype="float32")
-    return [data, kernel, conv]
-
-target = tvm.target.Target("cuda")
-
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Generate CUDA kernels from TVM sketch configurations')
 parser.add_argument('--log-file', '-f', type=str, default='allkernels.json',
                     help='Path to the sketch JSON file (default: allkernels.json)')
+parser.add_argument('--targets', nargs='+', metavar='LOG:ARCH[:NAME]', default=None,
+                    help='Generate several GPUs in one pass, e.g. allkernels.json.A100:sm_80 '
+                         'allkernels.json.V100:sm_70. Each gets kernel_<NAME>/, build_<NAME>/ and '
+                         'build_<NAME>.sh/profile_<NAME>.sh/time_<NAME>.sh (NAME defaults to the log '
+                         'suffix, e.g. A100, else the arch); replaces --log-file and --arch')
+parser.add_argument('--compress', choices=['none', 'gzip', 'zstd'], default='none',
+                    help='Compress each NCU export in profile.sh right after it is written (default: none)')
+parser.add_argument('--prune', action='store_true',
+                    help='Prune each NCU export in profile.sh to the metrics used by the dataset '
+                         '(raw originals are archived, see --raw-archive)')
+parser.add_argument('--raw-archive', type=str, default=None,
+                    help='With --compress/--prune: keep gzip-compressed raw exports in this directory '
+                         '(--prune always archives, by default to ncu_results_raw)')
+parser.add_argument('--compile-cache', action='store_true',
+                    help='Make build.sh build through compile_cache.py (reuses unchanged kernels)')
+parser.add_argument('--arch', type=str, default=None,
+                    help='Validate against this architecture\'s limits, e.g. sm_80 (default: each record\'s -arch target)')
+parser.add_argument('--validation-cache', type=str, default=VALIDATION_CACHE,
+                    help=f'Verdict cache from validate_sketches.py (default: {VALIDATION_CACHE}); '
+                         'records cached as invalid are skipped without lowering')
+parser.add_argument('--export-module', action='store_true',
+                    help='Export the TVM-compiled device module (PTX/cubin) per config and run it through '
+                         'the generic launcher instead of building per-config executables')
+parser.add_argument('--telemetry', action='store_true',
+                    help='Record power/clock telemetry (telemetry.py) around every NCU and timing run')
+parser.add_argument('--only', type=str, default=None,
+                    help='Comma-separated config indices (line indices) to generate, e.g. 3,17,42 '
+                         '(default: all; see active_select.py)')
 args = parser.parse_args()
 
 log_file = args.log_file
-
-print(f"Reading sketch configurations from: {log_file}")
-old_log = open(log_file, "r")
-all_config = old_log.readlines()
-assert len(all_config) > 0, "No configuration found in the log file."
-print(f"Found {len(all_config)} configuration(s)")
+compress = args.compress
+prune = args.prune
+raw_archive = args.raw_archive
+use_compile_cache = args.compile_cache
+arch_override = args.arch
+export_module = args.export_module
+record_telemetry = args.telemetry
+only_configs = {int(i) for i in args.only.split(',') if i.strip()} if args.only else None
+target_specs = args.targets
+if export_module and use_compile_cache:
+    print("Note: --compile-cache is not used with --export-module (no per-config builds)")
+if target_specs and arch_override:
+    print("Note: --arch is ignored with --targets (each target is validated for its own arch)")
+validation_cache = args.validation_cache
+verdicts = load_verdicts(validation_cache)
+if verdicts:
+    print(f"Loaded {len(verdicts)} cached validation verdict(s) from {validation_cache}")
+# Verdicts of records verified during this run, written back to the cache at the end
+new_verdicts = {}
 
 str_headers = '''
 #include <cassert>
@@ -58,62 +82,120 @@ str_headers = '''
 
 '''
 
-class RecordProcessor:
-    IDX_NODE_NAME = 0
-    IDX_STAGE = 1
-    IDX_ITER = 2
-    IDX_LOOP_EXTENT = 3
-    IDX_LENGTHS = 4
-    IDX_INNER_TO_OUTER = 5
-    IDX_TASK = 0
-    IDX_STATE = 1
-    IDX_TB = 2
-    LENGTH_PAR_DIM = 4
-    LENGTH_REDUC = 2
-
-    def __init__(self, record):
-        self.record = record
-        self.json_str = json.loads(record)
+class GenTarget:
+    """
+    One output tree of the generation pass: a sketch log built for one architecture.
+    The default tree is kernel/ + build/ with build.sh, profile.sh and time.sh;
+    a named target (--targets) writes kernel_<name>/ + build_<name>/ with
+    build_<name>.sh, profile_<name>.sh and time_<name>.sh.
+    """
+
+    def __init__(self, log_file, arch=None, name=None):
+        self.log_file = log_file
+        self.arch = arch
+        self.name = name
+        self.suffix = f"_{name}" if name else ""
+        self.kernel_dir = "kernel" + self.suffix
+        self.build_dir = "build" + self.suffix
+        # The default tree keeps the generic target; named trees compile for their own arch
+        self.target = tvm.target.Target(f"cuda -arch={arch}") if name else tvm.target.Target("cuda")
+
+        print(f"Reading sketch configurations from: {log_file}")
+        self.lines = load_sketch_lines(log_file)
+        assert len(self.lines) > 0, f"No configuration found in {log_file}."
+        print(f"Found {len(self.lines)} configuration(s)")
+
+        # Store all configurations for generating comprehensive run.sh
+        self.configs = []
+        # Records rejected by validation: (idx, arch, reason)
+        self.skipped = []
+
+    def script(self, kind):
+        """Name of a generated script of this tree, e.g. script('build') -> build_A100.sh."""
+        return f"{kind}{self.suffix}.sh"
+
+
+def parse_target(spec):
+    """
+    Parse a --targets entry 'LOG:ARCH[:NAME]' into a named GenTarget.
+    NAME defaults to the GPU suffix of the log (allkernels.json.A100 -> A100), else the arch.
+    """
+    parts = spec.split(':')
+    if len(parts) not in (2, 3) or not all(parts):
+        parser.error(f"invalid target '{spec}' (expected LOG:ARCH or LOG:ARCH:NAME)")
+    log, arch = parts[0], normalize_arch(parts[1])
+    suffix = os.path.splitext(log)[1][1:]
+    name = parts[2] if len(parts) == 3 else (suffix if suffix and suffix != 'json' else arch)
+    return GenTarget(log, arch, name.replace(' ', ''))
+
+def export_device_module(dev_mod, idx, kernel_dir):
+    """
+    Save the device code tvm.build already compiled as {kernel_dir}/kernel{idx}.ptx
+    (or .cubin if TVM is configured to emit cubin). In PTX the entry point is
+    renamed to kernel{idx} so profiles match the per-config executables.
+    Returns (module_path, function_name) for the launcher manifest.
+    """
+    ptx_path = f"{kernel_dir}/kernel{idx}.ptx"
+    try:
+        dev_mod.save(ptx_path)
+    except tvm.TVMError:
+        cubin_path = f"{kernel_dir}/kernel{idx}.cubin"
+        dev_mod.save(cubin_path)
+        return cubin_path, "default_function_kernel"
+
+    with open(ptx_path, "r") as f:
+        ptx = f.read()
+    with open(ptx_path, "w") as f:
+        f.write(ptx.replace("default_function_kernel", f"kernel{idx}"))
+    return ptx_path, f"kernel{idx}"
 
 file_path = "template/demo.cu"
 
-# Create kernel directory for generated files
-os.makedirs("kernel", exist_ok=True)
-
-# Store all configurations for generating comprehensive run.sh
-all_configs_data = []
-
-for idx, line in enumerate(all_config):
-    N, H, W, CO, CI, KH, KW, strides, padding = extract_values_from_json(line)
-    task = auto_scheduler.SearchTask(
-        func=conv2d, args=(N, H, W, CO, CI, KH, KW, strides, padding), target=target
-    )
-    inp, _ = load_record_from_string(line)
-    # task.get_measure_state(tmp_file.name)
-    sch, args = task.compute_dag.apply_steps_from_state(
-            inp.state, task.layout_rewrite_option
-        )
-    ir_module = tvm.lower(sch, args)
-    primfunc = ir_module["main"]
-    from tvm.tir.analysis import verify_gpu_code
-    valid = verify_gpu_code(primfunc, {"max_shared_memory_per_block": 48*1024, "max_threads_per_block": 1024})
-
-    if valid != 1:
+if target_specs:
+    gen_targets = [parse_target(spec) for spec in target_specs]
+    names = [gen.name for gen in gen_targets]
+    if len(set(names)) != len(names):
+        parser.error(f"duplicate target names {names}; give each LOG:ARCH a distinct :NAME")
+else:
+    gen_targets = [GenTarget(log_file, arch_override)]
+if only_configs is not None:
+    print(f"Generating only {len(only_configs)} selected configuration(s)")
+
+# Create kernel directories for generated files
+for gen in gen_targets:
+    os.makedirs(gen.kernel_dir, exist_ok=True)
+
+
+def generate_config(gen, idx, line, sch, args, primfunc):
+    """
+    Validate one lowered record for gen's architecture, then build it for gen's
+    target and write {kernel_dir}/kernel{idx}.cuh and .cu.
+    """
+    N, H, W, CO, CI, KH, KW, strides, padding = (parse_workload(line)[field] for field in WORKLOAD_FIELDS)
+    arch = record_arch(line, gen.arch)
+
+    key = verdict_key(line, arch)
+    if key not in verdicts and key not in new_verdicts:
+        new_verdicts[key] = {"valid": verify_primfunc(primfunc, arch), "reason": ""}
+        if not new_verdicts[key]["valid"]:
+            new_verdicts[key]["reason"] = rejection_reason(line, arch)
+    verdict = verdicts.get(key) or new_verdicts[key]
+    if not verdict["valid"]:
+        reason = verdict["reason"]
         print(f"\n{'='*60}")
-        print(f"ERROR: GPU code validation failed for configuration {idx}")
+        print(f"WARNING: GPU code validation failed for configuration {idx}, skipping")
         print(f"{'='*60}")
         print(f"Configuration parameters:")
         print(f"  N={N}, H={H}, W={W}, CO={CO}, CI={CI}, KH={KH}, KW={KW}")
         print(f"  Strides={strides}, Padding={padding}")
-        print(f"\nValidation result: {valid}")
-        print(f"This configuration exceeds GPU resource constraints.")
+        print(f"\nReason ({arch}): {reason}")
         print(f"{'='*60}\n")
-        import sys
-        sys.exit(1)
+        gen.skipped.append((idx, arch, reason))
+        return
 
     print(f"Configuration {idx} validated successfully")
     
-    func = tvm.build(sch, args, target)
+    func = tvm.build(sch, args, gen.target)
     str_source = func.imported_modules[0].get_source()
     print("source code: ", str_source)
     
@@ -122,32 +204,16 @@ for idx, line in enumerate(all_config):
     # replace "default_function_kernel" with "kernel{idx}" for cleaner profiling
     str_source = str_source.replace("default_function_kernel", f"kernel{idx}")
     
-    # dump to file kernel/kernel{idx}.cuh
-    with open(f"kernel/kernel{idx}.cuh", "w") as f:
+    # dump to file {kernel_dir}/kernel{idx}.cuh
+    with open(f"{gen.kernel_dir}/kernel{idx}.cuh", "w") as f:
         f.write(str_headers)
         f.write(str_source)
         
     # get parallel dimension tile list from the line
-    processor = RecordProcessor(line)
-    grid = 1
-    block = 1
-    for each in processor.json_str['i'][processor.IDX_STATE][1]:
-        if each[processor.IDX_NODE_NAME] == "SP" and len(each[processor.IDX_LENGTHS]) == 4:
-
-            dim_len = each[processor.IDX_LOOP_EXTENT]
-            tile_list = each[processor.IDX_LENGTHS]
-            # print("tile_list: ", tile_list)
-            # print("dim_len: ", dim_len)
-            
-            grid *= dim_len/np.prod(tile_list)
-            block *= tile_list[1]
-
-    if grid <= 0 or block <= 0:
-        print(f"Warning: Invalid grid={grid}, block={block}, using defaults")
-        grid, block = 1, 256
+    grid, block = launch_dims(line)
 
     # Store configuration data for later run.sh generation
-    all_configs_data.append({
+    gen.configs.append({
         'idx': idx,
         'N': N, 'H': H, 'W': W,
         'CO': CO, 'CI': CI,
@@ -158,14 +224,20 @@ for idx, line in enumerate(all_config):
         'block': block
     })
 
+    if export_module:
+        module_path, function_name = export_device_module(func.imported_modules[0], idx, gen.kernel_dir)
+        gen.configs[-1]['module'] = module_path
+        gen.configs[-1]['function'] = function_name
+        print(f"Exported {module_path}")
+
     # Generate separate .cu file for this configuration
-    output_path = f"kernel/kernel{idx}.cu"
+    output_path = f"{gen.kernel_dir}/kernel{idx}.cu"
     with open(file_path, "r") as f:
         lines = f.readlines()
 
     new_lines = []
     for line in lines:
-        # Fix include path for common.h since we're in kernel/ subdirectory
+        # Fix include path for common.h since we're in a kernel/ subdirectory
         if '#include "common.h"' in line:
             new_lines.append(line.replace('#include "common.h"', '#include "../template/common.h"'))
         else:
@@ -181,27 +253,130 @@ for idx, line in enumerate(all_config):
             new_lines.append(f"dim3 size_block_{idx}({block},1,1);\n")
 
             # TVM kernel signature: kernel(output, input, weights)
-            new_lines.append(f"kernel{idx} <<< size_grid_{idx}, size_block_{idx} >>>(dev_Output, dev_Input, dev_Kernel);\n")
+            # Wrapped in a lambda so the template can launch it once (NCU) or repeatedly (timing mode)
+            new_lines.append(f"auto launch_kernel = [&]() {{ kernel{idx} <<< size_grid_{idx}, size_block_{idx} >>>(dev_Output, dev_Input, dev_Kernel); }};\n")
 
     with open(output_path, "w") as f:
         f.writelines(new_lines)
 
     print(f"Generated {output_path}")
 
-# Generate build.sh and profile.sh for all configurations
-print(f"\nGenerating build.sh and profile.sh for {len(all_configs_data)} configurations...")
 
-# Generate build.sh
-build_script = """#!/bin/bash
+# Group the records of all targets by workload + schedule steps (schedule_key, not
+# sketch_hash, which includes the target and hardware params): applying the steps
+# and lowering are target-independent, so a schedule found in several targets'
+# logs (e.g. one log built for several archs) is done once and only validated
+# and built per target
+sketches = {}
+for gen in gen_targets:
+    for idx, line in enumerate(gen.lines):
+        if only_configs is not None and idx not in only_configs:
+            continue
+        sketches.setdefault(schedule_key(line), []).append((gen, idx, line))
+
+for records in sketches.values():
+    lowered = None
+    for gen, idx, line in records:
+        arch = record_arch(line, gen.arch)
+        cached = verdicts.get(verdict_key(line, arch))
+        if cached is not None and not cached["valid"]:
+            print(f"Skipping configuration {idx}: invalid for {arch} (cached: {cached['reason']})")
+            gen.skipped.append((idx, arch, cached["reason"]))
+            continue
+        if lowered is None:
+            sch, args = apply_sketch(line, gen.target)
+            lowered = (sch, args, tvm.lower(sch, args)["main"])
+        elif len(gen_targets) > 1:
+            print(f"Reusing the lowered schedule of configuration {idx} for {gen.name}")
+        generate_config(gen, idx, line, *lowered)
+
+# Cache the verdicts of this run, so later runs (and active_select.py) skip rejected records
+if new_verdicts and validation_cache:
+    verdicts.update(new_verdicts)
+    save_verdicts(verdicts, validation_cache)
+    print(f"Cached {len(new_verdicts)} new validation verdict(s) in {validation_cache}")
+
+for gen in gen_targets:
+    gen.configs.sort(key=lambda config: config['idx'])
+
+    # Write the configuration manifest used by the Python profiling drivers
+    with open(f"{gen.kernel_dir}/configs.json", "w") as f:
+        json.dump({"log_file": gen.log_file, "kernel_dir": gen.kernel_dir, "build_dir": gen.build_dir,
+                   "configs": gen.configs}, f, indent=1)
+    print(f"Generated {gen.kernel_dir}/configs.json")
+
+    # Write the launcher manifest: one line per configuration with module, grid/block and shape
+    if export_module:
+        with open(f"{gen.kernel_dir}/launch_manifest.txt", "w") as f:
+            f.write("# idx module function grid block N H W CO CI KH KW stride padding\n")
+            for config in gen.configs:
+                f.write(f"{config['idx']} {config['module']} {config['function']} {config['grid']} {config['block']} "
+                        f"{config['N']} {config['H']} {config['W']} {config['CO']} {config['CI']} "
+                        f"{config['KH']} {config['KW']} {config['strides'][0]} {config['padding'][0]}\n")
+        print(f"Generated {gen.kernel_dir}/launch_manifest.txt")
+
+
+def kernel_executable(gen, config):
+    """Executable that runs one configuration in the generated scripts."""
+    return f"./{gen.build_dir}/launcher" if export_module else f"./{gen.build_dir}/kernel_{config['idx']}"
+
+
+def kernel_arguments(gen, config):
+    """Command line arguments of kernel_executable(gen, config), before any timing arguments."""
+    if export_module:
+        return f"{gen.kernel_dir}/launch_manifest.txt {config['idx']}"
+    return (f"{config['N']} {config['H']} {config['W']} {config['CO']} {config['CI']} "
+            f"{config['KH']} {config['KW']} {config['strides'][0]} {config['padding'][0]}")
+
+
+def telemetry_prefix(config):
+    """Command prefix recording telemetry to $OUTPUT_DIR/telemetry_config_<idx>.json (with --telemetry)."""
+    if not record_telemetry:
+        return ""
+    return f"python3 telemetry.py record -o \"$OUTPUT_DIR/telemetry_config_{config['idx']}.json\" -- "
+
+
+def write_build_script(gen):
+    """Generate the build script of a tree."""
+    all_configs_data = gen.configs
+    build_script = """#!/bin/bash
 # Auto-generated build script for all sketch configurations
-# Total configurations: """ + str(len(all_configs_data)) + """
+# Total configurations: """ + str(len(all_configs_data)) + f"""
 
-mkdir -p build
+mkdir -p {gen.build_dir}
 
 """
+    if gen.name:
+        build_script += f"""# Kernels in {gen.kernel_dir}/ were generated for {gen.arch} (genkernel.py --targets)
+CUDA_ARCH=${{CUDA_ARCH:-{gen.arch[3:]}}}
+"""
+    else:
+        build_script += """# Take the CUDA architecture from the shared hardware snapshot instead of querying
+# on every CMake reconfigure (override with: CUDA_ARCH=86 bash build.sh)
+CUDA_ARCH=${CUDA_ARCH:-$(python3 hardware_info.py arch 2>/dev/null)}
+"""
+    build_script += """echo "CUDA architecture: ${CUDA_ARCH:-CMake default}"
 
-for config in all_configs_data:
-    build_script += f"""
+"""
+
+    if export_module:
+        build_script += f"""
+# Device code was exported by TVM ({gen.kernel_dir}/kernel*.ptx): build only the generic launcher
+cmake -S . -B {gen.build_dir} -DBUILD_LAUNCHER=ON ${{CUDA_ARCH:+-DCUDA_ARCH=$CUDA_ARCH}}
+cmake --build {gen.build_dir} --target launcher -j
+
+"""
+    elif use_compile_cache:
+        tree_flags = f" --kernel-dir {gen.kernel_dir} --build-dir {gen.build_dir}" if gen.name else ""
+        build_script += f"""
+# Build through the compile cache: unchanged kernels are reused, not recompiled
+python3 compile_cache.py{tree_flags} build ${{CUDA_ARCH:+--arch $CUDA_ARCH}} {' '.join(str(config['idx']) for config in all_configs_data)}
+
+"""
+    else:
+        tree_flag = f" -DKERNEL_DIR={gen.kernel_dir}" if gen.name else ""
+        for config in all_configs_data:
+            build_script += f"""
 echo ""
 echo "======================================"
 echo "Building Configuration {config['idx']}"
@@ -209,128 +384,152 @@ echo "Parameters: N={config['N']} H={config['H']} W={config['W']} CO={config['CO
 echo "Grid: {config['grid']}, Block: {config['block']}"
 echo "======================================"
 
-cd build
-cmake -DCONFIG_IDX={config['idx']} ..
+cd {gen.build_dir}
+cmake -DCONFIG_IDX={config['idx']}{tree_flag} ${{CUDA_ARCH:+-DCUDA_ARCH=$CUDA_ARCH}} ..
 make -j
 cd ..
 
 """
 
-build_script += """
+    build_script += f"""
 echo ""
 echo "======================================"
 echo "All builds completed!"
-echo "Executables: ./build/kernel_*"
+echo "Executables: ./{gen.build_dir}/kernel_*"
 echo "======================================"
 """
 
-with open("build.sh", "w") as f:
-    f.write(build_script)
+    with open(gen.script("build"), "w") as f:
+        f.write(build_script)
 
-os.chmod("build.sh", 0o755)
-
-# Generate profile.sh
-profile_script = """#!/bin/bash
-# Auto-generated profiling script for all sketch configurations
-# Total configurations: """ + str(len(all_configs_data)) + """
-#
-# This script auto-detects GPU type and profiles at different power cap settings:
-#   - A30: 3 power cap settings (powercap1-3)
-#   - Other GPUs: 5 power cap settings (powercap1-5)
-# Results are organized in ncu_results/powercap1/ through ncu_results/powercapN/
+    os.chmod(gen.script("build"), 0o755)
 
-set -e  # Exit on error
 
-echo "======================================"
+# Shared bash snippets for the generated per-power-cap scripts (profile.sh, time.sh)
+gpu_detection_script = """echo "======================================"
 echo "GPU Auto-Detection and Power Cap Setup"
 echo "======================================"
 
-# Detect GPU model
-GPU_NAME=$(nvidia-smi --query-gpu=name --format=csv,noheader -i 0)
-echo "Detected GPU: $GPU_NAME"
-
-# Select power cap array based on GPU model
+# GPU name, type and power cap array from the shared hardware snapshot
+# (hardware_info.py: one nvidia-smi query, cached in hardware_snapshot.json)
 # Note: A30 has 3 settings, other GPUs have 5 settings
-if [[ "$GPU_NAME" == *"RTX 3090"* ]]; then
-    POWER_CAPS=(100 200 300 400 450)
-    echo "GPU Type: RTX 3090"
-elif [[ "$GPU_NAME" == *"RTX 4090"* ]]; then
-    POWER_CAPS=(150 200 300 400 450)
-    echo "GPU Type: RTX 4090"
-elif [[ "$GPU_NAME" == *"A30"* ]]; then
-    POWER_CAPS=(100 130 165)
-    echo "GPU Type: A30"
-elif [[ "$GPU_NAME" == *"V100"* ]]; then
-    POWER_CAPS=(100 150 200 250 300)
-    echo "GPU Type: V100"
-elif [[ "$GPU_NAME" == *"A100"* ]]; then
-    POWER_CAPS=(100 200 250 300 400)
-    echo "GPU Type: A100"
-else
-    echo "ERROR: Unknown GPU model: $GPU_NAME"
-    echo "Supported GPUs: RTX 3090, RTX 4090, A30, V100, A100"
-    exit 1
-fi
+HW_CONFIG=$(python3 hardware_info.py shell) || exit 1
+eval "$HW_CONFIG"
+echo "Detected GPU: $GPU_NAME"
+echo "GPU Type: $GPU_TYPE"
 
 echo "Power cap settings: ${POWER_CAPS[@]} W"
 echo ""
 
-# Create base ncu_results directory
-mkdir -p ncu_results
+"""
 
-# Get number of power cap settings (3 for A30, 5 for others)
-NUM_POWER_CAPS=${#POWER_CAPS[@]}
 
-# Loop through all power cap settings dynamically
+def arch_check_script(gen):
+    """Bash check that GPU 0 matches the architecture a named tree was generated for."""
+    if not gen.name:
+        return ""
+    return f"""# Kernels in {gen.kernel_dir}/ were generated for {gen.arch}
+if [ "$CUDA_ARCH" != "{gen.arch[3:]}" ]; then
+    echo "ERROR: {gen.kernel_dir}/ targets {gen.arch}, but GPU 0 is sm_$CUDA_ARCH"
+    exit 1
+fi
+
+"""
+
+
+def power_cap_loop_header(results_dir):
+    """Bash loop header that sets each power cap and creates {results_dir}/powercap<N>/."""
+    return f"""# Loop through all power cap settings dynamically
 for PC_IDX in $(seq 1 $NUM_POWER_CAPS); do
-    POWER_CAP=${POWER_CAPS[$((PC_IDX-1))]}
-    OUTPUT_DIR="ncu_results/powercap${PC_IDX}"
+    POWER_CAP=${{POWER_CAPS[$((PC_IDX-1))]}}
+    OUTPUT_DIR="{results_dir}/powercap${{PC_IDX}}"
 
     echo ""
     echo "======================================"
-    echo "Power Cap ${PC_IDX}/${NUM_POWER_CAPS}: ${POWER_CAP}W"
+    echo "Power Cap ${{PC_IDX}}/${{NUM_POWER_CAPS}}: ${{POWER_CAP}}W"
     echo "======================================"
 
     # Create output directory
     mkdir -p "$OUTPUT_DIR"
 
     # Set power cap
-    echo "Setting GPU 0 power cap to ${POWER_CAP}W..."
+    echo "Setting GPU 0 power cap to ${{POWER_CAP}}W..."
     sudo nvidia-smi -i 0 -pl $POWER_CAP
-    sleep 1  # Brief delay for power cap to take effect
+    # Wait until the cap has taken effect (limit applied, SM clock stable) instead of a fixed delay;
+    # without telemetry it sleeps 1 s and exits 3, a timeout exits 2
+    python3 telemetry.py settle --power-cap $POWER_CAP --allow-fallback || echo "Warning: power cap settle not confirmed (telemetry.py settle exit $?)"
 
     # Verify power cap was set
-    ACTUAL_POWER=$(nvidia-smi -i 0 --query-gpu=power.limit --format=csv,noheader,nounits | awk '{print int($1)}')
-    echo "GPU 0 power cap confirmed: ${ACTUAL_POWER}W"
+    ACTUAL_POWER=$(nvidia-smi -i 0 --query-gpu=power.limit --format=csv,noheader,nounits | awk '{{print int($1)}}')
+    echo "GPU 0 power cap confirmed: ${{ACTUAL_POWER}}W"
     echo ""
 """
 
-# Add profiling loop for each power cap
-profile_script += """
+
+# Optional compression/pruning of each NCU export (see compress_ncu_results.py)
+postprocess_flags = ""
+if compress != 'none' or prune:
+    postprocess_flags = f"--codec {compress}"
+    if prune:
+        postprocess_flags += " --prune"
+    if raw_archive:
+        postprocess_flags += f" --archive {raw_archive}"
+
+
+def write_profile_script(gen):
+    """Generate the NCU profiling script of a tree."""
+    all_configs_data = gen.configs
+    profile_script = """#!/bin/bash
+# Auto-generated profiling script for all sketch configurations
+# Total configurations: """ + str(len(all_configs_data)) + """
+#
+# This script auto-detects GPU type and profiles at different power cap settings:
+#   - A30: 3 power cap settings (powercap1-3)
+#   - Other GPUs: 5 power cap settings (powercap1-5)
+# Results are organized in ncu_results/powercap1/ through ncu_results/powercapN/
+
+set -e  # Exit on error
+
+""" + gpu_detection_script + arch_check_script(gen) + """# Create base ncu_results directory
+mkdir -p ncu_results
+# Every row is profiled by this script, so drop any adaptive_profile.py derived-row manifest
+rm -f ncu_results/derived.json
+
+# Get number of power cap settings (3 for A30, 5 for others)
+NUM_POWER_CAPS=${#POWER_CAPS[@]}
+
+""" + power_cap_loop_header("ncu_results")
+
+    # Add profiling loop for each power cap
+    profile_script += """
     # Profile all configurations at this power cap
 """
 
-for config in all_configs_data:
-    profile_script += f"""
+    for config in all_configs_data:
+        profile_script += f"""
     echo "Profiling config {config['idx']} at ${{POWER_CAP}}W..."
 
     # Check if executable exists
-    if [ ! -f "./build/kernel_{config['idx']}" ]; then
-        echo "ERROR: ./build/kernel_{config['idx']} not found. Please run build.sh first."
+    if [ ! -f "{kernel_executable(gen, config)}" ]; then
+        echo "ERROR: {kernel_executable(gen, config)} not found. Please run {gen.script('build')} first."
         exit 1
     fi
 
-    ncu --target-processes all \\
+    {telemetry_prefix(config)}ncu --target-processes all \\
         --set full \\
         --print-details all \\
         --csv \\
         --log-file "$OUTPUT_DIR/ncu_config_{config['idx']}.csv" \\
-        ./build/kernel_{config['idx']} \\
-        {config['N']} {config['H']} {config['W']} {config['CO']} {config['CI']} {config['KH']} {config['KW']} {config['strides'][0]} {config['padding'][0]}
-
+        {kernel_executable(gen, config)} \\
+        {kernel_arguments(gen, config)}
 """
+        if postprocess_flags:
+            profile_script += f"""
+    python3 compress_ncu_results.py {postprocess_flags} "$OUTPUT_DIR/ncu_config_{config['idx']}.csv"
+"""
+        profile_script += "\n"
 
-profile_script += """
+    profile_script += """
     echo ""
     echo "Completed profiling at ${POWER_CAP}W"
     echo "Results saved to: $OUTPUT_DIR/"
@@ -352,24 +551,100 @@ done
 echo ""
 """
 
-with open("profile.sh", "w") as f:
-    f.write(profile_script)
-
-os.chmod("profile.sh", 0o755)
-
-print(f"\nGenerated build.sh and profile.sh with {len(all_configs_data)} configurations")
-print(f"\nGenerated files in kernel/ directory:")
-for config in all_configs_data:
-    print(f"  - kernel/kernel{config['idx']}.cuh")
-    print(f"  - kernel/kernel{config['idx']}.cu")
-print(f"\nGenerated scripts:")
-print(f"  - build.sh (builds all configurations)")
-print(f"  - profile.sh (auto-detects GPU and profiles at multiple power caps)")
-print(f"\nUsage:")
-print(f"  1. Build all: bash build.sh")
-print(f"  2. Profile at all power caps: bash profile.sh")
-print(f"     - Auto-detects GPU type (RTX 3090/4090, A30, V100, A100)")
-print(f"     - A30: Profiles at 3 power cap settings (100W, 130W, 165W)")
-print(f"     - Other GPUs: Profiles at 5 power cap settings")
-print(f"     - Results saved to ncu_results/powercap1/ through powercapN/")
-print(f"  3. Generate dataset: python generate_dataset.py")
+    with open(gen.script("profile"), "w") as f:
+        f.write(profile_script)
+
+    os.chmod(gen.script("profile"), 0o755)
+
+
+def write_time_script(gen):
+    """Generate the CUDA-event timing script of a tree, a fast alternative to NCU for time(ms) labels."""
+    all_configs_data = gen.configs
+    time_script = """#!/bin/bash
+# Auto-generated CUDA-event timing script for all sketch configurations
+# Total configurations: """ + str(len(all_configs_data)) + f"""
+#
+# Runs each kernel WARMUP times, then times REPEAT launches with CUDA events and
+# writes median/min/p90/mean latency to timing_results/powercapN/timing_config_<idx>.json.
+# Override the launch counts with: WARMUP=20 REPEAT=200 bash {gen.script('time')}
+
+set -e  # Exit on error
+
+WARMUP=${{WARMUP:-10}}
+REPEAT=${{REPEAT:-100}}
+
+""" + gpu_detection_script + arch_check_script(gen) + """# Create base timing_results directory
+mkdir -p timing_results
+
+# Get number of power cap settings (3 for A30, 5 for others)
+NUM_POWER_CAPS=${#POWER_CAPS[@]}
+
+""" + power_cap_loop_header("timing_results")
+
+    for config in all_configs_data:
+        time_script += f"""
+    echo "Timing config {config['idx']} at ${{POWER_CAP}}W..."
+    {telemetry_prefix(config)}{kernel_executable(gen, config)} \\
+        {kernel_arguments(gen, config)} \\
+        $WARMUP $REPEAT "$OUTPUT_DIR/timing_config_{config['idx']}.json"
+"""
+
+    time_script += """
+    echo "Completed timing at ${POWER_CAP}W"
+done
+
+echo ""
+echo "======================================"
+echo "All timing runs completed!"
+echo "Results organized in timing_results/powercap*/"
+echo "Generate the timing dataset with: python generate_dataset.py --timing-dir timing_results"
+echo "======================================"
+"""
+
+    with open(gen.script("time"), "w") as f:
+        f.write(time_script)
+
+    os.chmod(gen.script("time"), 0o755)
+
+
+for gen in gen_targets:
+    # Generate build.sh and profile.sh for all configurations
+    print(f"\nGenerating {gen.script('build')} and {gen.script('profile')} for {len(gen.configs)} configurations...")
+    write_build_script(gen)
+    write_profile_script(gen)
+    write_time_script(gen)
+
+    print(f"\nGenerated {gen.script('build')} and {gen.script('profile')} with {len(gen.configs)} configurations")
+    if gen.skipped:
+        print(f"\nSkipped {len(gen.skipped)} invalid configuration(s):")
+        for idx, arch, reason in gen.skipped:
+            print(f"  - config {idx} ({arch}): {reason}")
+        arch_flag = f" --arch {gen.arch}" if gen.name else ""
+        print(f"  Run 'python validate_sketches.py -f {gen.log_file}{arch_flag}' for a full report")
+    print(f"\nGenerated files in {gen.kernel_dir}/ directory:")
+    for config in gen.configs:
+        print(f"  - {gen.kernel_dir}/kernel{config['idx']}.cuh")
+        print(f"  - {gen.kernel_dir}/kernel{config['idx']}.cu")
+    print(f"\nGenerated scripts:")
+    print(f"  - {gen.script('build')} (builds all configurations)")
+    print(f"  - {gen.script('profile')} (auto-detects GPU and profiles at multiple power caps)")
+    print(f"  - {gen.script('time')} (CUDA-event timing at multiple power caps, no NCU)")
+
+if len(gen_targets) > 1:
+    print(f"\nShared schedule application across {len(gen_targets)} targets: "
+          f"{len(sketches)} distinct sketch(es) for "
+          f"{sum(len(records) for records in sketches.values())} record(s)")
+    print(f"\nUsage (on each GPU machine):")
+    for gen in gen_targets:
+        print(f"  - {gen.name} ({gen.arch}): bash {gen.script('build')} && bash {gen.script('profile')} "
+              f"&& python generate_dataset.py -f {gen.log_file}")
+else:
+    print(f"\nUsage:")
+    print(f"  1. Build all: bash build.sh")
+    print(f"  2. Profile at all power caps: bash profile.sh")
+    print(f"     - Auto-detects GPU type (RTX 3090/4090, A30, V100, A100)")
+    print(f"     - A30: Profiles at 3 power cap settings (100W, 130W, 165W)")
+    print(f"     - Other GPUs: Profiles at 5 power cap settings")
+    print(f"     - Results saved to ncu_results/powercap1/ through powercapN/")
+    print(f"  3. Generate dataset: python generate_dataset.py")
+    print(f"  Fast latency labels without NCU: bash time.sh && python generate_dataset.py --timing-dir timing_results")
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+One-shot hardware snapshot shared by all pipeline stages.
+
+A single nvidia-smi query collects name, compute capability, persistence and
+compute mode, power limits and max clocks of every GPU. The result is cached in
+hardware_snapshot.json (re-queried when older than SNAPSHOT_MAX_AGE_S or
+taken with another driver) and served to run_pipeline.py, generate_dataset.py,
+compile_cache.py and the generated build.sh / profile.sh / time.sh, together
+with GPU_TABLE, the one table of supported GPUs (architecture, power caps).
+
+For CPU-only runs (dataset generation, validation, tests) point
+HARDWARE_SNAPSHOT at an offline snapshot file; nvidia-smi is then never called.
+
+Usage:
+    python hardware_info.py                          # query, cache and print the snapshot
+    python hardware_info.py snapshot --offline A100 -o a100_snapshot.json
+    HARDWARE_SNAPSHOT=a100_snapshot.json python generate_dataset.py
+    python hardware_info.py shell                    # GPU_NAME/GPU_TYPE/CUDA_ARCH/POWER_CAPS for bash
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+# Cached snapshot file, and the environment variable naming an offline snapshot
+SNAPSHOT_FILE = "hardware_snapshot.json"
+SNAPSHOT_ENV = "HARDWARE_SNAPSHOT"
+
+# A cached snapshot older than this (seconds) is re-queried: power limits, persistence
+# and compute mode can be changed by setup_gpu.sh or an admin at any time
+SNAPSHOT_MAX_AGE_S = 6 * 3600
+
+# Loaded kernel driver version, compared against the cached snapshot's driver_version
+DRIVER_VERSION_FILE = "/proc/driver/nvidia/version"
+
+# Supported GPUs: architecture and power cap settings (watts)
+# Note: A30 has 3 settings, others have 5 settings
+GPU_TABLE = {
+    "RTX 3090": {"arch": "sm_86", "power_caps": [100, 200, 300, 400, 450]},
+    "RTX 4090": {"arch": "sm_89", "power_caps": [150, 200, 300, 400, 450]},
+    "A30": {"arch": "sm_80", "power_caps": [100, 130, 165]},
+    "V100": {"arch": "sm_70", "power_caps": [100, 150, 200, 250, 300]},
+    "A100": {"arch": "sm_80", "power_caps": [100, 200, 250, 300, 400]},
+}
+
+# Power cap settings per GPU type (kept under the name the pipeline scripts use)
+POWER_CAP_CONFIGS = {name: info["power_caps"] for name, info in GPU_TABLE.items()}
+
+# nvidia-smi query fields -> snapshot keys (numeric fields are parsed as float)
+QUERY_FIELDS = [
+    ("index", "index", int),
+    ("name", "name", str),
+    ("compute_cap", "compute_cap", str),
+    ("persistence_mode", "persistence_mode", str),
+    ("compute_mode", "compute_mode", str),
+    ("power.limit", "power_limit_w", float),
+    ("power.min_limit", "power_min_limit_w", float),
+    ("power.max_limit", "power_max_limit_w", float),
+    ("power.default_limit", "power_default_limit_w", float),
+    ("clocks.max.sm", "max_sm_clock_mhz", float),
+    ("clocks.max.mem", "max_mem_clock_mhz", float),
+    ("memory.total", "memory_total_mib", float),
+    ("driver_version", "driver_version", str),
+]
+
+_snapshot = None  # per-process memo
+
+
+def query_gpus():
+    """
+    Query every GPU with one nvidia-smi call.
+    Returns a list of dicts keyed by the snapshot keys of QUERY_FIELDS.
+    Raises RuntimeError if nvidia-smi is missing or fails.
+    """
+    fields = ",".join(field for field, _, _ in QUERY_FIELDS)
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", f"--query-gpu={fields}", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, check=True
+        )
+    except FileNotFoundError:
+        raise RuntimeError("nvidia-smi not found. Please install NVIDIA drivers.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"nvidia-smi command failed (exit code {e.returncode}). "
+                           "GPU drivers may not be installed.")
+
+    gpus = []
+    for line in result.stdout.strip().splitlines():
+        values = [v.strip() for v in line.split(",")]
+        gpu = {}
+        for (_, key, cast), value in zip(QUERY_FIELDS, values):
+            try:
+                gpu[key] = cast(value)
+            except ValueError:
+                gpu[key] = None  # "[N/A]" / "[Not Supported]"
+        gpus.append(gpu)
+    return gpus
+
+
+def take_snapshot():
+    """Query the hardware now. Raises RuntimeError if nvidia-smi is unavailable."""
+    return {
+        "source": "nvidia-smi",
+        "host": socket.gethostname(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "gpus": query_gpus(),
+    }
+
+
+def offline_snapshot(gpu_type):
+    """Synthetic snapshot of a GPU_TABLE entry, for machines without that GPU."""
+    info = GPU_TABLE[gpu_type]
+    return {
+        "source": "offline",
+        "host": None,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "gpus": [{
+            "index": 0,
+            "name": f"NVIDIA {gpu_type}",
+            "compute_cap": info["arch"][3] + "." + info["arch"][4:],
+            "power_max_limit_w": float(max(info["power_caps"])),
+        }],
+    }
+
+
+def save_snapshot(snapshot, path=SNAPSHOT_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def loaded_driver_version():
+    """Version of the loaded NVIDIA kernel driver, or None if it cannot be read."""
+    try:
+        with open(DRIVER_VERSION_FILE) as f:
+            match = re.search(r"\b(\d+\.\d+(?:\.\d+)?)\b", f.readline())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+def stale_reason(snapshot, max_age_s=SNAPSHOT_MAX_AGE_S):
+    """Why a cached snapshot can no longer be used, or None if it is still valid."""
+    if snapshot.get("source") == "offline":
+        return f"offline snapshot, use it through ${SNAPSHOT_ENV}"
+    if snapshot.get("host") != socket.gethostname():
+        return f"taken on host {snapshot.get('host')}"
+    try:
+        age = time.time() - time.mktime(time.strptime(snapshot["timestamp"], "%Y-%m-%d %H:%M:%S"))
+    except (KeyError, TypeError, ValueError):
+        return "no valid timestamp"
+    if age > max_age_s:
+        return f"{age / 3600:.1f} h old"
+    driver = loaded_driver_version()
+    cached_drivers = {gpu.get("driver_version") for gpu in snapshot["gpus"]}
+    if driver is not None and cached_drivers != {driver}:
+        return f"driver changed to {driver}"
+    return None
+
+
+def load_snapshot(path=SNAPSHOT_FILE, refresh=False):
+    """
+    Return the hardware snapshot, querying nvidia-smi at most once.
+
+    Order: the offline file named by $HARDWARE_SNAPSHOT, the in-process memo,
+    the cached path (if taken on this host within SNAPSHOT_MAX_AGE_S with the
+    loaded driver), then a fresh query cached to path.
+    refresh=True always re-queries. Returns None if no GPU can be queried.
+    """
+    global _snapshot
+
+    offline_path = os.environ.get(SNAPSHOT_ENV)
+    if offline_path:
+        with open(offline_path) as f:
+            return json.load(f)
+
+    if not refresh:
+        if _snapshot is not None:
+            return _snapshot
+        if os.path.exists(path):
+            with open(path) as f:
+                cached = json.load(f)
+            reason = stale_reason(cached)
+            if reason is None:
+                _snapshot = cached
+                return _snapshot
+            print(f"Cached hardware snapshot {path} is stale ({reason}), re-querying", file=sys.stderr)
+
+    try:
+        _snapshot = take_snapshot()
+    except RuntimeError as e:
+        print(f"Warning: Could not query GPU hardware: {e}", file=sys.stderr)
+        return None
+    save_snapshot(_snapshot, path)
+    return _snapshot
+
+
+def primary_gpu(snapshot):
+    """GPU 0 of a snapshot (the profiling GPU), or None."""
+    if not snapshot or not snapshot["gpus"]:
+        return None
+    return snapshot["gpus"][0]
+
+
+def match_gpu_type(gpu_name):
+    """GPU_TABLE key contained in an nvidia-smi GPU name, or None."""
+    for gpu_type in GPU_TABLE:
+        if gpu_type in gpu_name:
+            return gpu_type
+    return None
+
+
+def detect_gpu_type(snapshot=None):
+    """
+    GPU_TABLE key of GPU 0 (e.g. "RTX 3090"), or None if unknown/undetectable.
+    """
+    gpu = primary_gpu(snapshot or load_snapshot())
+    if gpu is None:
+        return None
+    gpu_type = match_gpu_type(gpu["name"])
+    if gpu_type is None:
+        print(f"Warning: Unknown GPU '{gpu['name']}'. Cannot determine power cap values.")
+    return gpu_type
+
+
+def cuda_arch(snapshot=None):
+    """Compute capability of GPU 0 without the dot (e.g. '86'), or None."""
+    gpu = primary_gpu(snapshot or load_snapshot())
+    if gpu is None or not gpu.get("compute_cap"):
+        return None
+    return gpu["compute_cap"].replace(".", "")
+
+
+def shell_config(snapshot=None):
+    """
+    Bash assignments of GPU_NAME, GPU_TYPE, CUDA_ARCH and POWER_CAPS for the
+    generated scripts. Raises RuntimeError if GPU 0 is not in GPU_TABLE.
+    """
+    snapshot = snapshot or load_snapshot()
+    gpu = primary_gpu(snapshot)
+    if gpu is None:
+        raise RuntimeError("Could not detect GPU 0")
+    gpu_type = match_gpu_type(gpu["name"])
+    if gpu_type is None:
+        raise RuntimeError(f"Unknown GPU model: {gpu['name']}\n"
+                           f"Supported GPUs: {', '.join(GPU_TABLE)}")
+    return "\n".join([
+        f"GPU_NAME=\"{gpu['name']}\"",
+        f"GPU_TYPE=\"{gpu_type}\"",
+        f"CUDA_ARCH={cuda_arch(snapshot) or ''}",
+        f"POWER_CAPS=({' '.join(str(w) for w in GPU_TABLE[gpu_type]['power_caps'])})",
+    ])
+
+
+def print_snapshot(snapshot):
+    print(f"Source: {snapshot['source']} ({snapshot['timestamp']})")
+    for gpu in snapshot["gpus"]:
+        gpu_type = match_gpu_type(gpu["name"])
+        print(f"GPU {gpu['index']}: {gpu['name']} (compute {gpu.get('compute_cap')}, "
+              f"{GPU_TABLE[gpu_type]['arch'] if gpu_type else 'unsupported'})")
+        for key in ("persistence_mode", "compute_mode", "power_limit_w", "power_max_limit_w",
+                    "max_sm_clock_mhz", "max_mem_clock_mhz", "driver_version"):
+            if gpu.get(key) is not None:
+                print(f"  {key}: {gpu[key]}")
+        if gpu_type:
+            print(f"  power caps: {GPU_TABLE[gpu_type]['power_caps']} W")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared GPU hardware snapshot")
+    parser.add_argument("--file", type=str, default=SNAPSHOT_FILE,
+                        help=f"Snapshot cache file (default: {SNAPSHOT_FILE})")
+    sub = parser.add_subparsers(dest="command")
+
+    p_snapshot = sub.add_parser("snapshot", help="Query the GPUs (or write an offline snapshot)")
+    p_snapshot.add_argument("--offline", choices=list(GPU_TABLE), default=None,
+                            help="Write a synthetic snapshot of this GPU instead of querying")
+    p_snapshot.add_argument("--output", "-o", type=str, default=None,
+                            help="Output file (default: the cache file; required with --offline, "
+                                 "which must not overwrite the cache file)")
+
+    p_shell = sub.add_parser("shell", help="Print GPU_NAME/GPU_TYPE/CUDA_ARCH/POWER_CAPS bash assignments")
+    p_arch = sub.add_parser("arch", help="Print the compute capability of GPU 0 (e.g. 86)")
+    for p in (p_shell, p_arch):
+        p.add_argument("--refresh", action="store_true",
+                       help="Re-query nvidia-smi instead of using the cached snapshot")
+
+    args = parser.parse_args()
+
+    if args.command in ("shell", "arch"):
+        snapshot = load_snapshot(args.file, refresh=args.refresh)
+        if snapshot is None:
+            return 1
+
+    if args.command == "shell":
+        try:
+            print(shell_config(snapshot))
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command == "arch":
+        arch = cuda_arch(snapshot)
+        if arch is None:
+            return 1
+        print(arch)
+        return 0
+
+    if args.command == "snapshot" and args.offline:
+        # Offline snapshots are read through $HARDWARE_SNAPSHOT, never from the cache file
+        if not args.output or os.path.abspath(args.output) == os.path.abspath(args.file):
+            parser.error(f"--offline needs -o FILE other than the cache file {args.file} "
+                         f"(then run with {SNAPSHOT_ENV}=FILE)")
+        snapshot = offline_snapshot(args.offline)
+        save_snapshot(snapshot, args.output)
+        print(f"Wrote offline snapshot of {args.offline} to {args.output}")
+        print(f"Use it with: {SNAPSHOT_ENV}={args.output} python generate_dataset.py")
+        return 0
+
+    snapshot = load_snapshot(args.file, refresh=True)
+    if snapshot is None:
+        return 1
+    if args.command == "snapshot" and args.output:
+        save_snapshot(snapshot, args.output)
+    print_snapshot(snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
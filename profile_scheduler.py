@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Cost-aware profiling scheduler with wall-time estimation.
+
+profile.sh profiles configs in index order with no idea how long each takes.
+This scheduler estimates the NCU wall time of every config from:
+  - the conv shape (N, H, W, CO, CI, KH, KW): host-side tensor generation in
+    template/main.cpp scales with the input + weight size
+  - the grid/block of the launch
+  - the TVM-measured kernel cost in the sketch's "r" field, multiplied by the
+    number of NCU replay passes of `--set full`
+and refines the estimate with past timings (profile_timings.json): configs
+profiled before use their measured mean, the others are scaled by the median
+measured/estimated ratio on this GPU.
+
+The work is ordered by a policy (index, shortest-first, longest-first), the
+projected completion time is printed before starting, and --time-budget picks
+the most valuable subset that fits in a window (configs of workloads not yet
+covered first, cheapest first).
+
+Usage:
+    python profile_scheduler.py --dry-run                       # print the plan only
+    python profile_scheduler.py --policy shortest-first
+    python profile_scheduler.py --time-budget 2h
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+
+from adaptive_profile import CONFIGS_FILE, load_configs, profile_config, set_power_cap
+from generate_dataset import DERIVED_MANIFEST, NCU_RESULTS_DIR
+from hardware_info import POWER_CAP_CONFIGS, detect_gpu_type
+from sketch_records import load_sketch_lines, measured_cost, sketch_hash
+
+# Past per-run profiling wall times, keyed by "<gpu>:<sketch hash>"
+TIMINGS_FILE = "profile_timings.json"
+
+POLICIES = ["index", "shortest-first", "longest-first"]
+
+# Prior cost model (seconds). Calibrated against history at run time.
+NCU_STARTUP_S = 4.0            # ncu + process + CUDA context start-up
+NCU_FULL_SET_PASSES = 40       # kernel replays for --set full
+HOST_GEN_S_PER_MELEM = 0.25    # template/main.cpp tensor generation (itr=25), per million elements
+LAUNCH_S_PER_KBLOCK = 0.002    # per-replay launch/save-restore overhead, per thousand blocks
+POWER_CAP_SWITCH_S = 2.0       # nvidia-smi -pl + settle delay
+
+
+def parse_duration(text):
+    """Parse '5400', '90m', '1.5h' or '2h30m' into seconds."""
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+    total = 0.0
+    matched = False
+    for value, unit in re.findall(r"(\d+(?:\.\d+)?)([hms])", text):
+        total += float(value) * {"h": 3600, "m": 60, "s": 1}[unit]
+        matched = True
+    if not matched:
+        raise argparse.ArgumentTypeError(f"invalid duration: {text}")
+    return total
+
+
+def load_timings(path=TIMINGS_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_timings(timings, path=TIMINGS_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(timings, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def prior_estimate(config, kernel_cost_s):
+    """Prior wall-time estimate (seconds) of one NCU run of a config."""
+    elements = (config["N"] * config["CI"] * config["H"] * config["W"]
+                + config["CO"] * config["CI"] * config["KH"] * config["KW"])
+    estimate = NCU_STARTUP_S + HOST_GEN_S_PER_MELEM * elements / 1e6
+    kernel_s = kernel_cost_s if kernel_cost_s is not None else 1e-3
+    estimate += NCU_FULL_SET_PASSES * (kernel_s + LAUNCH_S_PER_KBLOCK * config["grid"] / 1e3)
+    return estimate
+
+
+class CostModel:
+    """
+    Per-config NCU wall-time estimator, refined by past timings on this GPU.
+    """
+
+    def __init__(self, gpu, timings):
+        self.gpu = gpu
+        self.timings = timings
+        self.scale = 1.0
+
+    def key(self, line):
+        return f"{self.gpu}:{sketch_hash(line)}"
+
+    def calibrate(self, configs, lines):
+        """Set the prior's scale to the median measured/estimated ratio of known configs."""
+        ratios = []
+        for config in configs:
+            line = lines[config["idx"]]
+            runs = self.timings.get(self.key(line))
+            if runs:
+                prior = prior_estimate(config, measured_cost(line))
+                ratios.append((sum(runs) / len(runs)) / prior)
+        if ratios:
+            ratios.sort()
+            self.scale = ratios[len(ratios) // 2]
+        return len(ratios)
+
+    def estimate(self, config, line):
+        """Estimated seconds for one NCU run of config."""
+        runs = self.timings.get(self.key(line))
+        if runs:
+            return sum(runs) / len(runs)
+        return self.scale * prior_estimate(config, measured_cost(line))
+
+    def record(self, line, seconds):
+        self.timings.setdefault(self.key(line), []).append(round(seconds, 3))
+
+
+def workload_of(config):
+    return (config["N"], config["H"], config["W"], config["CO"], config["CI"],
+            config["KH"], config["KW"], config["strides"][0], config["padding"][0])
+
+
+def select_within_budget(jobs, budget_s, fixed_s):
+    """
+    Greedily pick the most valuable jobs that fit in budget_s.
+    A job's value is 1 / (1 + configs of the same workload already picked), so
+    uncovered workloads come first; ties go to the cheapest job.
+    """
+    remaining = budget_s - fixed_s
+    selected = []
+    per_workload = {}
+    candidates = list(jobs)
+    while candidates:
+        best = max(
+            candidates,
+            key=lambda job: (1.0 / (1 + per_workload.get(workload_of(job["config"]), 0))) / job["cost_s"],
+        )
+        candidates.remove(best)
+        if best["cost_s"] > remaining:
+            continue
+        selected.append(best)
+        remaining -= best["cost_s"]
+        workload = workload_of(best["config"])
+        per_workload[workload] = per_workload.get(workload, 0) + 1
+    return selected
+
+
+def order_jobs(jobs, policy):
+    if policy == "shortest-first":
+        return sorted(jobs, key=lambda job: job["cost_s"])
+    if policy == "longest-first":
+        return sorted(jobs, key=lambda job: -job["cost_s"])
+    return sorted(jobs, key=lambda job: job["config"]["idx"])
+
+
+def print_plan(jobs, skipped, power_caps, total_s):
+    start = datetime.datetime.now()
+    print("======================================")
+    print("Profiling Plan")
+    print("======================================")
+    print(f"{'config':>8} {'N H W CO CI KH KW':>28} {'est/run':>9} {'est total':>10}")
+    for job in jobs:
+        c = job["config"]
+        shape = f"{c['N']} {c['H']} {c['W']} {c['CO']} {c['CI']} {c['KH']} {c['KW']}"
+        print(f"{c['idx']:>8} {shape:>28} {job['run_s']:>8.1f}s {job['cost_s']:>9.1f}s")
+    if skipped:
+        print(f"\nNot scheduled (outside time budget): {len(skipped)} config(s): "
+              f"{', '.join(str(job['config']['idx']) for job in skipped)}")
+    print(f"\nPower caps: {power_caps} W")
+    print(f"Projected wall time: {datetime.timedelta(seconds=int(total_s))}")
+    print(f"Projected completion: {(start + datetime.timedelta(seconds=total_s)).strftime('%Y-%m-%d %H:%M:%S')}")
+    print("")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost-aware profiling scheduler")
+    parser.add_argument("--configs", type=str, default=CONFIGS_FILE,
+                        help=f"Configuration manifest from genkernel.py (default: {CONFIGS_FILE})")
+    parser.add_argument("--ncu-dir", type=str, default=NCU_RESULTS_DIR,
+                        help=f"NCU results directory (default: {NCU_RESULTS_DIR})")
+    parser.add_argument("--policy", choices=POLICIES, default="shortest-first",
+                        help="Order of the profiling work (default: shortest-first)")
+    parser.add_argument("--time-budget", type=parse_duration, default=None,
+                        help="Only profile the most valuable subset that fits, e.g. 5400, 90m, 2h")
+    parser.add_argument("--timings", type=str, default=TIMINGS_FILE,
+                        help=f"Past profiling timings (default: {TIMINGS_FILE})")
+    parser.add_argument("--compress", choices=["none", "gzip", "zstd"], default="none",
+                        help="Compress each NCU export after it is written (default: none)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Prune each NCU export to the metrics used by the dataset (raw originals are "
+                             "archived in ncu_results_raw/)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the plan and projected completion time without profiling")
+    args = parser.parse_args()
+
+    gpu_type = detect_gpu_type()
+    if gpu_type is None:
+        print("ERROR: Unknown GPU model, cannot select power caps")
+        print(f"Supported GPUs: {', '.join(POWER_CAP_CONFIGS)}")
+        return 1
+    power_caps = POWER_CAP_CONFIGS[gpu_type]
+
+    with open(args.configs) as f:
+        log_file = json.load(f)["log_file"]
+    configs = load_configs(args.configs)
+    lines = load_sketch_lines(log_file)
+
+    model = CostModel(gpu_type.replace(" ", ""), load_timings(args.timings))
+    calibrated = model.calibrate(configs, lines)
+    print(f"Cost model: {calibrated} config(s) with past timings, prior scale {model.scale:.2f}")
+
+    jobs = []
+    for config in configs:
+        run_s = model.estimate(config, lines[config["idx"]])
+        jobs.append({"config": config, "run_s": run_s, "cost_s": run_s * len(power_caps)})
+
+    fixed_s = POWER_CAP_SWITCH_S * len(power_caps)
+    skipped = []
+    if args.time_budget is not None:
+        selected = select_within_budget(jobs, args.time_budget, fixed_s)
+        skipped = [job for job in jobs if job not in selected]
+        jobs = selected
+    jobs = order_jobs(jobs, args.policy)
+
+    total_s = fixed_s + sum(job["cost_s"] for job in jobs)
+    print_plan(jobs, skipped, power_caps, total_s)
+    if args.dry_run or not jobs:
+        return 0
+
+    # Every scheduled run is a real profile; drop a stale adaptive-sweep manifest
+    derived_path = os.path.join(args.ncu_dir, DERIVED_MANIFEST)
+    if os.path.exists(derived_path):
+        os.remove(derived_path)
+
+    # Profile cap-major (one power limit change per cap), configs in schedule order.
+    # Configs are committed during the first cap only while the projected time of
+    # all their caps still fits the budget; later caps profile exactly the committed
+    # configs, so every config ends up with all power caps or none.
+    started = time.time()
+    done = 0
+    committed = []
+    try:
+        for pc_idx, watts in enumerate(power_caps, start=1):
+            output_dir = os.path.join(args.ncu_dir, f"powercap{pc_idx}")
+            os.makedirs(output_dir, exist_ok=True)
+            set_power_cap(watts)
+            for job in (jobs if pc_idx == 1 else committed):
+                config = job["config"]
+                if pc_idx == 1 and args.time_budget is not None:
+                    remaining_caps = len(power_caps) - 1
+                    projected = (time.time() - started + job["cost_s"]
+                                 + POWER_CAP_SWITCH_S * remaining_caps
+                                 + remaining_caps * sum(model.estimate(c["config"], lines[c["config"]["idx"]])
+                                                        for c in committed))
+                    if projected > args.time_budget:
+                        print(f"Time budget exhausted, not starting config {config['idx']} "
+                              f"(projected {datetime.timedelta(seconds=int(projected))} for all caps)")
+                        break
+                print(f"Profiling config {config['idx']} at {watts}W (est {job['run_s']:.1f}s)...")
+                run_started = time.time()
+                profile_config(config, output_dir, args.compress, args.prune)
+                model.record(lines[config["idx"]], time.time() - run_started)
+                if pc_idx == 1:
+                    committed.append(job)
+                done += 1
+    finally:
+        save_timings(model.timings, args.timings)
+        elapsed = time.time() - started
+        print(f"\nProfiled {done} run(s) in {datetime.timedelta(seconds=int(elapsed))} "
+              f"(projected {datetime.timedelta(seconds=int(total_s))})")
+        print(f"Timings saved to {args.timings}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
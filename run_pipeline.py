@@ -12,6 +12,8 @@ import sys
 import argparse
 import os
 
+from hardware_info import save_snapshot, take_snapshot
+
 
 def run_command(cmd, description, shell=False):
     """
@@ -59,105 +61,59 @@ def validate_gpu_setup():
     errors = []
     warnings = []
 
-    # Check 1: nvidia-smi is accessible without sudo
+    # Check 1: nvidia-smi is accessible without sudo (one query serves every check
+    # and is cached in hardware_snapshot.json for the later pipeline stages)
     try:
-        result = subprocess.run(
-            ['nvidia-smi', '--query-gpu=index', '--format=csv,noheader'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # Count number of lines (each line is one GPU)
-        gpu_count = len(result.stdout.strip().split('\n'))
-        print(f"✓ nvidia-smi accessible (detected {gpu_count} GPU(s))")
-    except subprocess.CalledProcessError:
-        errors.append("nvidia-smi command failed. GPU drivers may not be installed.")
+        snapshot = take_snapshot()
+    except RuntimeError as e:
+        errors.append(str(e))
         return False, errors, warnings
-    except FileNotFoundError:
-        errors.append("nvidia-smi not found. Please install NVIDIA drivers.")
+    gpus = snapshot["gpus"]
+    gpu_count = len(gpus)
+    if gpu_count == 0:
+        errors.append("nvidia-smi reported no GPUs. Check that the GPU is visible to this "
+                      "machine/container.")
         return False, errors, warnings
+    save_snapshot(snapshot)
+    print(f"✓ nvidia-smi accessible (detected {gpu_count} GPU(s))")
+    gpu0 = gpus[0]
 
     # Check 2: Persistent mode enabled for GPU 0
-    try:
-        result = subprocess.run(
-            ['nvidia-smi', '-i', '0', '--query-gpu=persistence_mode', '--format=csv,noheader'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        persistence_mode = result.stdout.strip()
-        if persistence_mode == "Enabled":
-            print(f"✓ Persistent mode enabled on GPU 0")
-        else:
-            errors.append(f"Persistent mode is NOT enabled on GPU 0 (current: {persistence_mode})")
-    except subprocess.CalledProcessError as e:
-        errors.append(f"Failed to query persistent mode: {e}")
+    persistence_mode = gpu0["persistence_mode"]
+    if persistence_mode == "Enabled":
+        print(f"✓ Persistent mode enabled on GPU 0")
+    else:
+        errors.append(f"Persistent mode is NOT enabled on GPU 0 (current: {persistence_mode})")
 
     # Check 3: For multi-GPU, check compute mode
     if gpu_count > 1:
         # Check GPU 0 is in Default mode (allows compute)
-        try:
-            result = subprocess.run(
-                ['nvidia-smi', '-i', '0', '--query-gpu=compute_mode', '--format=csv,noheader'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            compute_mode_0 = result.stdout.strip()
-            if compute_mode_0 == "Default":
-                print(f"✓ GPU 0 compute mode: {compute_mode_0} (enabled)")
-            else:
-                errors.append(f"GPU 0 compute mode is {compute_mode_0}, should be Default")
-        except subprocess.CalledProcessError as e:
-            warnings.append(f"Failed to query GPU 0 compute mode: {e}")
+        compute_mode_0 = gpu0["compute_mode"]
+        if compute_mode_0 == "Default":
+            print(f"✓ GPU 0 compute mode: {compute_mode_0} (enabled)")
+        else:
+            errors.append(f"GPU 0 compute mode is {compute_mode_0}, should be Default")
 
         # Check other GPUs are disabled
-        for i in range(1, gpu_count):
-            try:
-                result = subprocess.run(
-                    ['nvidia-smi', '-i', str(i), '--query-gpu=compute_mode', '--format=csv,noheader'],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                compute_mode = result.stdout.strip()
-                if compute_mode == "Prohibited":
-                    print(f"✓ GPU {i} compute mode: {compute_mode} (disabled)")
-                else:
-                    warnings.append(f"GPU {i} compute mode is {compute_mode}, should be Prohibited (disabled)")
-            except subprocess.CalledProcessError as e:
-                warnings.append(f"Failed to query GPU {i} compute mode: {e}")
+        for gpu in gpus[1:]:
+            compute_mode = gpu["compute_mode"]
+            if compute_mode == "Prohibited":
+                print(f"✓ GPU {gpu['index']} compute mode: {compute_mode} (disabled)")
+            else:
+                warnings.append(f"GPU {gpu['index']} compute mode is {compute_mode}, should be Prohibited (disabled)")
 
     # Check 4: Power cap is reasonable (at least 70% of max)
-    try:
-        # Get current power limit
-        result = subprocess.run(
-            ['nvidia-smi', '-i', '0', '--query-gpu=power.limit', '--format=csv,noheader,nounits'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        current_power = float(result.stdout.strip())
-
-        # Get max power limit
-        result = subprocess.run(
-            ['nvidia-smi', '-i', '0', '--query-gpu=power.max_limit', '--format=csv,noheader,nounits'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        max_power = float(result.stdout.strip())
-
+    current_power = gpu0["power_limit_w"]
+    max_power = gpu0["power_max_limit_w"]
+    if current_power is None or not max_power:
+        warnings.append("Failed to query power cap (power limits not reported by nvidia-smi)")
+    else:
         power_percentage = (current_power / max_power) * 100
 
         print(f"✓ GPU 0 power cap: {current_power:.1f}W / {max_power:.1f}W ({power_percentage:.1f}%)")
 
         if power_percentage < 70:
             warnings.append(f"GPU 0 power cap is only {power_percentage:.1f}% of maximum. Consider increasing for better performance.")
-    except subprocess.CalledProcessError as e:
-        warnings.append(f"Failed to query power cap: {e}")
-    except ValueError as e:
-        warnings.append(f"Failed to parse power cap values: {e}")
 
     return len(errors) == 0, errors, warnings
 
@@ -187,6 +143,27 @@ def main():
         action='store_true',
         help='Skip profiling step (use existing ncu_results/powercap*/ files)'
     )
+    parser.add_argument(
+        '--skip-validation',
+        action='store_true',
+        help='Skip the parallel sketch validation pass before kernel generation'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Profile with adaptive_profile.py (extreme power caps first, derive intermediates when unchanged)'
+    )
+    parser.add_argument(
+        '--time-budget',
+        type=str,
+        default=None,
+        help='Profile with profile_scheduler.py, shortest-first within this budget (e.g. 2h, 90m)'
+    )
+    parser.add_argument(
+        '--compile-cache',
+        action='store_true',
+        help='Build kernels through compile_cache.py (reuse unchanged kernels)'
+    )
     parser.add_argument(
         '--skip-gpu-check',
         action='store_true',
@@ -234,8 +211,17 @@ def main():
 
     # Step 1: Generate CUDA kernels from TVM sketches
     if not args.skip_genkernel:
+        # Validate all sketches in parallel first; genkernel.py skips cached invalid records
+        if not args.skip_validation:
+            run_command(
+                ['python', 'validate_sketches.py', '-f', args.log_file],
+                f"Validating sketches in {args.log_file} against device limits"
+            )
+        genkernel_cmd = ['python', 'genkernel.py', '-f', args.log_file]
+        if args.compile_cache:
+            genkernel_cmd.append('--compile-cache')
         run_command(
-            ['python', 'genkernel.py', '-f', args.log_file],
+            genkernel_cmd,
             f"Generating CUDA kernels from {args.log_file}"
         )
     else:
@@ -263,11 +249,22 @@ def main():
             print("Please run genkernel.py first to generate profile.sh")
             sys.exit(1)
 
-        run_command(
-            'bash profile.sh',
-            "Profiling all kernels at 5 power caps (auto-detected GPU type)",
-            shell=True
-        )
+        if args.time_budget:
+            run_command(
+                ['python', 'profile_scheduler.py', '--time-budget', args.time_budget],
+                f"Profiling the most valuable kernels within {args.time_budget}"
+            )
+        elif args.adaptive:
+            run_command(
+                ['python', 'adaptive_profile.py'],
+                "Profiling all kernels with an adaptive power cap sweep"
+            )
+        else:
+            run_command(
+                'bash profile.sh',
+                "Profiling all kernels at 5 power caps (auto-detected GPU type)",
+                shell=True
+            )
     else:
         print("\n⊘ Skipping profiling (--skip-profiling)")
 
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Helpers for reading TVM auto-scheduler sketch records (one JSON record per line).
+Pure Python: no TVM import, so these can be used by every pipeline stage.
+
+Record layout (measure record v0.6):
+    {"i": [[workload_key, target, hardware_params, ...], [[], steps]],
+     "r": [[costs...], error_no, all_cost, timestamp],
+     "v": "v0.6"}
+"""
+import hashlib
+import json
+
+IDX_NODE_NAME = 0
+IDX_LOOP_EXTENT = 3
+IDX_LENGTHS = 4
+
+WORKLOAD_FIELDS = ["N", "H", "W", "CO", "CI", "KH", "KW", "strides", "padding"]
+
+
+def load_sketch_lines(log_file):
+    """
+    Read a sketch log and return its non-empty lines.
+    The list index is the configuration index (kernel{idx}, ncu_config_<idx>)
+    everywhere: genkernel.py, the dataset, validation and the feature store
+    all number sketches through this function, so blank lines never shift it.
+    """
+    with open(log_file, "r") as f:
+        return [line for line in f.readlines() if line.strip()]
+
+
+def sketch_hash(line):
+    """
+    Stable identifier of a sketch: hash of the task + schedule state ("i" field).
+    The measurement ("r") and version fields are excluded, so re-measuring the
+    same sketch, or finding it in another log, yields the same hash.
+    """
+    record = json.loads(line) if isinstance(line, str) else line
+    canonical = json.dumps(record["i"], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def schedule_key(line):
+    """
+    Target-independent identifier of a sketch: hash of the workload key and the
+    schedule steps only. Unlike sketch_hash, the target string and hardware
+    parameters are excluded, so the same schedule searched for (or copied to)
+    several GPUs yields the same key.
+    """
+    record = json.loads(line) if isinstance(line, str) else line
+    canonical = json.dumps([record["i"][0][0], record["i"][1]], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_workload(record):
+    """
+    Return the conv2d workload arguments as a dict:
+        {N, H, W, CO, CI, KH, KW, strides, padding}
+    """
+    record = json.loads(record) if isinstance(record, str) else record
+    value_list = json.loads(record["i"][0][0])
+    return dict(zip(WORKLOAD_FIELDS, value_list[1:]))
+
+
+def workload_key(record):
+    """Return the raw workload key string, e.g. '["conv2d", 1, 56, 56, ...]'."""
+    record = json.loads(record) if isinstance(record, str) else record
+    return record["i"][0][0]
+
+
+def target_string(record):
+    """Return the target string stored with the record (e.g. 'cuda ... -arch=sm_86 ...')."""
+    record = json.loads(record) if isinstance(record, str) else record
+    return record["i"][0][1]
+
+
+def target_arch(record):
+    """
+    Return the '-arch=' value of the record's target (e.g. 'sm_86'),
+    or None if the target string does not specify one.
+    """
+    for token in target_string(record).split():
+        if token.startswith("-arch="):
+            return token.split("=", 1)[1]
+    return None
+
+
+def measured_cost(record):
+    """
+    Return the mean auto-scheduler measured cost in seconds from the "r" field,
+    or None if the measurement failed (error_no != 0) or is missing.
+    """
+    record = json.loads(record) if isinstance(record, str) else record
+    result = record.get("r")
+    if not result or result[1] != 0 or not result[0]:
+        return None
+    costs = result[0]
+    return sum(costs) / len(costs)
+
+
+def schedule_steps(record):
+    """Return the list of transform steps of the record's schedule state."""
+    record = json.loads(record) if isinstance(record, str) else record
+    return record["i"][1][1]
+
+
+def launch_dims(record):
+    """
+    Derive (grid, block) from the 4-level spatial split ("SP") steps:
+    grid multiplies extent / prod(tiles), block multiplies the thread-level tile.
+    Falls back to (1, 256) if the derived values are invalid.
+    """
+    grid = 1
+    block = 1
+    for step in schedule_steps(record):
+        if step[IDX_NODE_NAME] == "SP" and len(step[IDX_LENGTHS]) == 4:
+            tile_list = step[IDX_LENGTHS]
+            tile_prod = 1
+            for tile in tile_list:
+                tile_prod *= tile
+            grid *= step[IDX_LOOP_EXTENT] / tile_prod
+            block *= tile_list[1]
+
+    if grid <= 0 or block <= 0:
+        print(f"Warning: Invalid grid={grid}, block={block}, using defaults")
+        return 1, 256
+    return int(grid), block
+
+
+def schedule_features(record):
+    """
+    Cheap, target-independent schedule features of a sketch:
+        grid, block, num_steps, unroll_max_step, shared_stages,
+        spatial_tiles (flattened 4-level SP tiles), reduce_tiles (2-level SP tiles)
+    """
+    record = json.loads(record) if isinstance(record, str) else record
+    grid, block = launch_dims(record)
+    steps = schedule_steps(record)
+
+    unroll_max_step = 0
+    shared_stages = 0
+    spatial_tiles = []
+    reduce_tiles = []
+    for step in steps:
+        name = step[IDX_NODE_NAME]
+        if name == "PR" and "auto_unroll_max_step$" in step[-1]:
+            unroll_max_step = int(step[-1].split("$", 1)[1])
+        elif name == "CHR" and step[2] == "shared":
+            shared_stages += 1
+        elif name == "SP" and len(step[IDX_LENGTHS]) == 4:
+            spatial_tiles.extend(step[IDX_LENGTHS])
+        elif name == "SP" and len(step[IDX_LENGTHS]) == 2:
+            reduce_tiles.extend(step[IDX_LENGTHS])
+
+    return {
+        "grid": grid,
+        "block": block,
+        "num_steps": len(steps),
+        "unroll_max_step": unroll_max_step,
+        "shared_stages": shared_stages,
+        "spatial_tiles": spatial_tiles,
+        "reduce_tiles": reduce_tiles,
+    }
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Background power/clock telemetry sampler for profiling runs.
+
+A single streaming `nvidia-smi -lms` process (NvidiaSmiSource) is polled at a
+fixed rate by a background thread into a ring buffer (TelemetrySampler). Samples
+can be tied to the config being profiled (sampler.window(label)), summarised
+into dataset columns (summarize), and used to detect when the GPU has settled
+after a power cap change (wait_for_settle), replacing the blind `sleep 1`.
+
+Any iterable of sample dicts can act as a source, so the sampler is testable
+with StubSource (a fixed list or a callable) instead of a GPU.
+
+Samples: {"t": monotonic seconds, "power_w", "sm_clock_mhz", "temp_c",
+          "throttle": active clock-throttle reason bitmask, "power_limit_w"}
+
+Usage:
+    python telemetry.py settle --power-cap 250                   # wait until the cap took effect
+    python telemetry.py settle --power-cap 250 --allow-fallback  # sleep 1 s if there is no telemetry
+    python telemetry.py record -o telemetry_config_3.json -- ./build/kernel_3 1 56 56 ...
+    python telemetry.py record --stub samples.json -o out.json -- sleep 1   # no GPU needed
+"""
+import argparse
+import collections
+import contextlib
+import json
+import subprocess
+import sys
+import threading
+import time
+
+# nvidia-smi query fields -> sample keys
+QUERY_FIELDS = [
+    ("power.draw", "power_w"),
+    ("clocks.sm", "sm_clock_mhz"),
+    ("temperature.gpu", "temp_c"),
+    ("clocks_throttle_reasons.active", "throttle"),
+    ("power.limit", "power_limit_w"),
+]
+
+# Sampling period and ring buffer length (4096 samples at 20 ms = ~80 s)
+SAMPLE_INTERVAL_MS = 20
+RING_SIZE = 4096
+
+# Throttle reason bit for an idle GPU (not a real throttle)
+THROTTLE_GPU_IDLE = 0x1
+
+# settle_after_power_cap outcomes, and the `settle` exit status of each
+# (1 is telemetry unavailable without --allow-fallback)
+SETTLED = "settled"
+TIMED_OUT = "timeout"
+FALLBACK = "fallback"
+SETTLE_EXIT_STATUS = {SETTLED: 0, TIMED_OUT: 2, FALLBACK: 3}
+
+# Blind delay used instead of settle detection when telemetry is unavailable
+FALLBACK_SLEEP_S = 1.0
+
+# Summary columns added to the datasets by generate_dataset.py
+TELEMETRY_COLUMNS = [
+    "power_mean(w)", "power_max(w)",
+    "sm_clock_mean(mhz)", "sm_clock_min(mhz)",
+    "temp_max(c)", "throttle_frac", "telemetry_samples",
+]
+
+
+def parse_sample(line, t=None):
+    """Parse one `--format=csv,noheader,nounits` line into a sample dict."""
+    values = [v.strip() for v in line.split(",")]
+    sample = {"t": time.monotonic() if t is None else t}
+    for (field, key), value in zip(QUERY_FIELDS, values):
+        try:
+            sample[key] = int(value, 16) if key == "throttle" else float(value)
+        except ValueError:
+            sample[key] = None  # "[N/A]"
+    return sample
+
+
+class NvidiaSmiSource:
+    """
+    Streams samples of GPU 0 from one long-running nvidia-smi process.
+    """
+
+    def __init__(self, interval_ms=SAMPLE_INTERVAL_MS, gpu=0):
+        self.cmd = [
+            "nvidia-smi", "-i", str(gpu),
+            "--query-gpu=" + ",".join(field for field, _ in QUERY_FIELDS),
+            "--format=csv,noheader,nounits", f"-lms={interval_ms}",
+        ]
+        self.process = None
+
+    def __iter__(self):
+        # Started eagerly so a missing nvidia-smi raises in the caller, not the sampler thread
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+        return (parse_sample(line) for line in self.process.stdout if line.strip())
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+class StubSource:
+    """
+    Test source: yields the given samples (a list of dicts, or a callable
+    f(i) -> dict or None to stop) every interval_s seconds, stamping "t".
+    """
+
+    def __init__(self, samples, interval_s=0.0):
+        self.samples = samples
+        self.interval_s = interval_s
+        self.closed = False
+
+    def __iter__(self):
+        i = 0
+        while not self.closed:
+            if callable(self.samples):
+                sample = self.samples(i)
+            else:
+                sample = self.samples[i] if i < len(self.samples) else None
+            if sample is None:
+                return
+            yield {**sample, "t": time.monotonic()}
+            i += 1
+            if self.interval_s:
+                time.sleep(self.interval_s)
+
+    def close(self):
+        self.closed = True
+
+
+class TelemetrySampler:
+    """
+    Background thread draining a telemetry source into a ring buffer.
+    Samples are also appended to every open window, so windows longer than the
+    ring buffer are not truncated.
+    """
+
+    def __init__(self, source=None, ring_size=RING_SIZE):
+        self.source = source if source is not None else NvidiaSmiSource()
+        self.ring = collections.deque(maxlen=ring_size)
+        self.lock = threading.Lock()
+        self.open_windows = {}
+        self.windows = {}
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        samples = iter(self.source)
+        self.thread = threading.Thread(target=self._run, args=(samples,), daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self, samples):
+        for sample in samples:
+            if self.stopped.is_set():
+                break
+            with self.lock:
+                self.ring.append(sample)
+                for window in self.open_windows.values():
+                    window.append(sample)
+
+    def stop(self):
+        self.stopped.set()
+        self.source.close()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def recent(self, n=None):
+        """The last n samples of the ring buffer (all if n is None)."""
+        with self.lock:
+            samples = list(self.ring)
+        return samples if n is None else samples[-n:]
+
+    @contextlib.contextmanager
+    def window(self, label):
+        """
+        Collect the samples taken while the block runs into self.windows[label].
+        """
+        samples = []
+        with self.lock:
+            self.open_windows[label] = samples
+        try:
+            yield samples
+        finally:
+            with self.lock:
+                del self.open_windows[label]
+                self.windows[label] = samples
+
+
+def summarize(samples):
+    """Summarise a window of samples into the TELEMETRY_COLUMNS values (None if empty)."""
+
+    def values(key):
+        return [s[key] for s in samples if s.get(key) is not None]
+
+    power, clock, temp = values("power_w"), values("sm_clock_mhz"), values("temp_c")
+    throttle = values("throttle")
+    return {
+        "power_mean(w)": sum(power) / len(power) if power else None,
+        "power_max(w)": max(power) if power else None,
+        "sm_clock_mean(mhz)": sum(clock) / len(clock) if clock else None,
+        "sm_clock_min(mhz)": min(clock) if clock else None,
+        "temp_max(c)": max(temp) if temp else None,
+        "throttle_frac": (sum(1 for t in throttle if t & ~THROTTLE_GPU_IDLE) / len(throttle)
+                          if throttle else None),
+        "telemetry_samples": len(samples),
+    }
+
+
+def is_settled(samples, power_cap=None, tolerance=0.02):
+    """
+    True if the power limit matches power_cap (within 1 W, when reported) and
+    the SM clock of every sample is within tolerance of their maximum.
+    """
+    if not samples:
+        return False
+    if power_cap is not None:
+        limits = [s.get("power_limit_w") for s in samples]
+        if any(limit is not None and abs(limit - power_cap) > 1.0 for limit in limits):
+            return False
+    clocks = [s["sm_clock_mhz"] for s in samples if s.get("sm_clock_mhz") is not None]
+    if not clocks:
+        return True
+    return (max(clocks) - min(clocks)) <= tolerance * max(clocks)
+
+
+def wait_for_settle(sampler, power_cap=None, tolerance=0.02, stable_samples=10, timeout=10.0):
+    """
+    Block until the last stable_samples samples are settled (see is_settled).
+    Returns the seconds waited, or None if timeout was reached first.
+    """
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        recent = [s for s in sampler.recent(stable_samples) if s["t"] >= started]
+        if len(recent) >= stable_samples and is_settled(recent, power_cap, tolerance):
+            return time.monotonic() - started
+        time.sleep(0.01)
+    return None
+
+
+def settle_after_power_cap(power_cap, source=None, timeout=10.0, allow_fallback=False):
+    """
+    Wait for a power cap change to take effect (replaces a fixed sleep).
+    Returns SETTLED, TIMED_OUT or FALLBACK. If telemetry is unavailable, raises
+    RuntimeError unless allow_fallback, which sleeps FALLBACK_SLEEP_S instead.
+    """
+    try:
+        with TelemetrySampler(source) as sampler:
+            waited = wait_for_settle(sampler, power_cap, timeout=timeout)
+    except OSError as e:
+        if not allow_fallback:
+            raise RuntimeError(f"Telemetry unavailable ({e}), cannot confirm the {power_cap}W cap took effect")
+        print(f"Warning: Telemetry unavailable ({e}), sleeping {FALLBACK_SLEEP_S:.0f}s "
+              f"instead of confirming the {power_cap}W cap took effect")
+        time.sleep(FALLBACK_SLEEP_S)
+        return FALLBACK
+    if waited is None:
+        print(f"Warning: GPU did not settle at {power_cap}W within {timeout:.0f}s")
+        return TIMED_OUT
+    print(f"GPU settled at {power_cap}W after {waited:.2f}s")
+    return SETTLED
+
+
+def load_stub(path, interval_s=SAMPLE_INTERVAL_MS / 1000):
+    """StubSource replaying the sample list in a JSON file, cyclically."""
+    with open(path) as f:
+        samples = json.load(f)
+    return StubSource(lambda i: samples[i % len(samples)], interval_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPU power/clock telemetry sampler")
+    parser.add_argument("--interval-ms", type=int, default=SAMPLE_INTERVAL_MS,
+                        help=f"Sampling period (default: {SAMPLE_INTERVAL_MS} ms)")
+    parser.add_argument("--stub", type=str, default=None,
+                        help="Replay samples from this JSON list instead of nvidia-smi (testing)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_settle = sub.add_parser("settle", help="Wait until a power cap change has taken effect")
+    p_settle.add_argument("--power-cap", type=float, default=None)
+    p_settle.add_argument("--timeout", type=float, default=10.0)
+    p_settle.add_argument("--allow-fallback", action="store_true",
+                          help="Sleep 1 s if telemetry is unavailable instead of failing "
+                               "(exit status 3; 2 if the GPU did not settle in time)")
+
+    p_record = sub.add_parser("record", help="Run a command and record telemetry while it runs")
+    p_record.add_argument("--output", "-o", type=str, required=True,
+                          help="Telemetry JSON (summary + samples)")
+    p_record.add_argument("cmd", nargs=argparse.REMAINDER,
+                          help="Command to run (after --)")
+
+    args = parser.parse_args()
+    if args.stub:
+        source = load_stub(args.stub, args.interval_ms / 1000)
+    else:
+        source = NvidiaSmiSource(args.interval_ms)
+
+    if args.command == "settle":
+        try:
+            status = settle_after_power_cap(args.power_cap, source, args.timeout, args.allow_fallback)
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        return SETTLE_EXIT_STATUS[status]
+
+    cmd = args.cmd[1:] if args.cmd and args.cmd[0] == "--" else args.cmd
+    if not cmd:
+        parser.error("record needs a command after --")
+    with TelemetrySampler(source) as sampler:
+        with sampler.window("cmd") as samples:
+            returncode = subprocess.run(cmd).returncode
+    with open(args.output, "w") as f:
+        json.dump({"cmd": cmd, "returncode": returncode, "summary": summarize(samples),
+                   "samples": samples}, f)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
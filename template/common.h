@@ -2,6 +2,8 @@
 #include <iostream>
 #include <cmath>
 #include <limits>
+#include <algorithm>
+#include <cstdio>
 
 #ifndef _COMMON_H
 #define _COMMON_H
@@ -84,8 +86,32 @@ inline void generate_kernel(int NK, int NC, int NR, int NS, TYPE **Kernel, int i
     *Kernel = Ker;
 }
 
+// Write CUDA-event timing statistics (median/min/p90/mean, in ms) as JSON.
+// times is sorted in place. Writes to stdout if path is NULL.
+inline void write_timing_json(const char *path, float *times, int repeat, int warmup) {
+    std::sort(times, times + repeat);
+    double sum = 0.0;
+    for (int i = 0; i < repeat; i++) sum += times[i];
+    double median = (repeat % 2) ? times[repeat / 2] : 0.5 * (times[repeat / 2 - 1] + times[repeat / 2]);
+    int p90_idx = (int) std::ceil(0.9 * repeat) - 1;
+
+    FILE *out = path ? fopen(path, "w") : stdout;
+    if (out == NULL) {
+        fprintf(stderr, "Error: cannot open %s\n", path);
+        exit(1);
+    }
+    fprintf(out, "{\"warmup\": %d, \"repeat\": %d, \"median_ms\": %.6f, \"min_ms\": %.6f, "
+                 "\"p90_ms\": %.6f, \"mean_ms\": %.6f}\n",
+            warmup, repeat, median, times[0], times[p90_idx], sum / repeat);
+    if (path) fclose(out);
+}
+
+// warmup/repeat/timing_file select the timing mode: with repeat > 0 the kernel is
+// launched warmup times, then timed repeat times with CUDA events; otherwise it is
+// launched once (NCU profiling mode).
 void conv_kernel_wrapper(int N_B, int N_C, int N_H, int N_W, int N_F, int N_R, int N_S, int PaddingH, int PaddingW,
-                    int StrideH, int StrideW, int N_X, int N_Y, const float *Input, const float *Kernel, float *Output, int itr);
+                    int StrideH, int StrideW, int N_X, int N_Y, const float *Input, const float *Kernel, float *Output, int itr,
+                    int warmup, int repeat, const char *timing_file);
 
                     
 #endif // _COMMON_H
@@ -0,0 +1,156 @@
+// Generic launcher for TVM-compiled device modules (PTX or cubin).
+//
+// Instead of compiling one executable per configuration, genkernel.py --export-module
+// saves the module TVM already compiled (kernel/kernel<idx>.ptx or .cubin) and writes
+// kernel/launch_manifest.txt with one line per configuration:
+//
+//   <idx> <module path> <function name> <grid> <block> <N> <H> <W> <CO> <CI> <KH> <KW> <stride> <padding>
+//
+// Usage: launcher <manifest> <idx> [<warmup> <repeat> [timing.json]]
+// Without warmup/repeat the kernel is launched once (NCU profiling mode), like kernel_<idx>.
+#include <string.h>
+#include <stdlib.h>
+#include <stdio.h>
+#include <cuda.h>
+#include "common.h"
+
+#define CHECK_CU(call)                                                         \
+{                                                                              \
+    const CUresult result = call;                                              \
+    if (result != CUDA_SUCCESS)                                                \
+    {                                                                          \
+        const char *reason = NULL;                                             \
+        cuGetErrorString(result, &reason);                                     \
+        fprintf(stderr, "Error: %s:%d, ", __FILE__, __LINE__);                 \
+        fprintf(stderr, "code: %d, reason: %s\n", result,                      \
+                reason ? reason : "unknown");                                  \
+        exit(1);                                                               \
+    }                                                                          \
+}
+
+struct LaunchConfig {
+    int idx;
+    char module_path[4096];
+    char function_name[256];
+    unsigned int grid, block;
+    int N, H, W, CO, CI, KH, KW, stride, padding;
+};
+
+// Find the manifest line of configuration idx. Returns 0 on success.
+static int read_manifest(const char *path, int idx, LaunchConfig *cfg) {
+    FILE *f = fopen(path, "r");
+    if (f == NULL) {
+        fprintf(stderr, "Error: cannot open manifest %s\n", path);
+        return 1;
+    }
+    char line[8192];
+    while (fgets(line, sizeof(line), f)) {
+        if (line[0] == '#') continue;
+        int n = sscanf(line, "%d %4095s %255s %u %u %d %d %d %d %d %d %d %d %d",
+                       &cfg->idx, cfg->module_path, cfg->function_name, &cfg->grid, &cfg->block,
+                       &cfg->N, &cfg->H, &cfg->W, &cfg->CO, &cfg->CI, &cfg->KH, &cfg->KW,
+                       &cfg->stride, &cfg->padding);
+        if (n == 14 && cfg->idx == idx) {
+            fclose(f);
+            return 0;
+        }
+    }
+    fclose(f);
+    fprintf(stderr, "Error: configuration %d not found in %s\n", idx, path);
+    return 1;
+}
+
+int main(int argc, char *argv[]) {
+
+    if (argc < 3) {
+        printf("Usage: %s <manifest> <idx> [<warmup> <repeat> [timing.json]]\n", argv[0]);
+        return 1;
+    }
+
+    LaunchConfig cfg;
+    if (read_manifest(argv[1], atoi(argv[2]), &cfg) != 0) {
+        return 1;
+    }
+
+    // Optional timing mode: <warmup> <repeat> [timing.json]
+    int warmup = argc > 3 ? atoi(argv[3]) : 0;
+    int repeat = argc > 4 ? atoi(argv[4]) : 0;
+    const char *timing_file = argc > 5 ? argv[5] : NULL;
+
+    int N_X = ((cfg.W - cfg.KW + 2 * cfg.padding) / cfg.stride + 1); /*output x*/
+    int N_Y = ((cfg.H - cfg.KH + 2 * cfg.padding) / cfg.stride + 1); /*output y*/
+
+    size_t input_size = sizeof(float) * cfg.N * cfg.CI * cfg.H * cfg.W;
+    size_t kernel_size = sizeof(float) * cfg.CO * cfg.CI * cfg.KH * cfg.KW;
+    size_t output_size = sizeof(float) * cfg.N * cfg.CO * N_Y * N_X;
+
+    float *Input;
+    float *Kernel;
+    generate_input_tensor(cfg.N, cfg.CI, cfg.H, cfg.W, &Input, 1);
+    generate_kernel(cfg.CO, cfg.CI, cfg.KH, cfg.KW, &Kernel, 1);
+    float *Output = (float *) malloc(output_size);
+
+    CHECK_CU(cuInit(0));
+    CUdevice device;
+    CHECK_CU(cuDeviceGet(&device, 0));
+    CUcontext context;
+    CHECK_CU(cuDevicePrimaryCtxRetain(&context, device));
+    CHECK_CU(cuCtxSetCurrent(context));
+
+    CUmodule module;
+    CHECK_CU(cuModuleLoad(&module, cfg.module_path));
+    CUfunction function;
+    CHECK_CU(cuModuleGetFunction(&function, module, cfg.function_name));
+
+    CUdeviceptr dev_Input, dev_Kernel, dev_Output;
+    CHECK_CU(cuMemAlloc(&dev_Kernel, kernel_size));
+    CHECK_CU(cuMemcpyHtoD(dev_Kernel, Kernel, kernel_size));
+    CHECK_CU(cuMemAlloc(&dev_Input, input_size));
+    CHECK_CU(cuMemcpyHtoD(dev_Input, Input, input_size));
+    CHECK_CU(cuMemAlloc(&dev_Output, output_size));
+    CHECK_CU(cuMemsetD8(dev_Output, 0, output_size));
+
+    // TVM kernel signature: kernel(output, input, weights)
+    void *kernel_args[] = {&dev_Output, &dev_Input, &dev_Kernel};
+
+    if (repeat <= 0) {
+        // NCU profiling mode: a single launch
+        CHECK_CU(cuLaunchKernel(function, cfg.grid, 1, 1, cfg.block, 1, 1, 0, NULL, kernel_args, NULL));
+    } else {
+        // Timing mode: warmup launches, then CUDA-event timed launches
+        for (int i = 0; i < warmup; i++) {
+            CHECK_CU(cuLaunchKernel(function, cfg.grid, 1, 1, cfg.block, 1, 1, 0, NULL, kernel_args, NULL));
+        }
+        CHECK_CU(cuCtxSynchronize());
+
+        CUevent start, stop;
+        CHECK_CU(cuEventCreate(&start, CU_EVENT_DEFAULT));
+        CHECK_CU(cuEventCreate(&stop, CU_EVENT_DEFAULT));
+        float *times = (float *) malloc(sizeof(float) * repeat);
+        for (int i = 0; i < repeat; i++) {
+            CHECK_CU(cuEventRecord(start, NULL));
+            CHECK_CU(cuLaunchKernel(function, cfg.grid, 1, 1, cfg.block, 1, 1, 0, NULL, kernel_args, NULL));
+            CHECK_CU(cuEventRecord(stop, NULL));
+            CHECK_CU(cuEventSynchronize(stop));
+            CHECK_CU(cuEventElapsedTime(&times[i], start, stop));
+        }
+        CHECK_CU(cuCtxSynchronize());
+        write_timing_json(timing_file, times, repeat, warmup);
+        free(times);
+        CHECK_CU(cuEventDestroy(start));
+        CHECK_CU(cuEventDestroy(stop));
+    }
+
+    CHECK_CU(cuMemcpyDtoH(Output, dev_Output, output_size));
+
+    CHECK_CU(cuMemFree(dev_Input));
+    CHECK_CU(cuMemFree(dev_Kernel));
+    CHECK_CU(cuMemFree(dev_Output));
+    CHECK_CU(cuModuleUnload(module));
+    CHECK_CU(cuDevicePrimaryCtxRelease(device));
+
+    free(Input);
+    free(Kernel);
+    free(Output);
+    return 0;
+}
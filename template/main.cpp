@@ -22,6 +22,11 @@ int main(int argc, char *argv[]) {
     int strides = atoi(argv[8]);
     int padding = atoi(argv[9]);
 
+    // Optional timing mode: <warmup> <repeat> [timing.json]
+    int warmup = argc > 10 ? atoi(argv[10]) : 0;
+    int repeat = argc > 11 ? atoi(argv[11]) : 0;
+    const char *timing_file = argc > 12 ? argv[12] : NULL;
+
     int N_X = ((N_W - N_S + 2 * padding) / strides + 1); /*output x*/
     int N_Y = ((N_H - N_R + 2 * padding) / strides + 1); /*output y*/
 
@@ -35,7 +40,8 @@ int main(int argc, char *argv[]) {
     Output = (TYPE *) malloc(sizeof(TYPE) * N_B * N_F * N_Y * N_X);
 
     conv_kernel_wrapper(N_B, N_C, N_H, N_W, N_F, N_R, N_S, padding, padding,
-                        strides, strides, N_X, N_Y, Input, Kernel, Output, itr);
+                        strides, strides, N_X, N_Y, Input, Kernel, Output, itr,
+                        warmup, repeat, timing_file);
 
     return 0;
 
@@ -0,0 +1,48 @@
+"""
+TVM auto-scheduler workload definitions shared by genkernel.py and validate_sketches.py.
+The function name is part of the workload key stored in the sketch records
+('["conv2d", N, H, W, CO, CI, KH, KW, stride, padding]'), so it must not change.
+"""
+from tvm import te, auto_scheduler, topi
+from tvm.auto_scheduler.measure_record import load_record_from_string
+
+from sketch_records import parse_workload, workload_key
+
+
+@auto_scheduler.register_workload
+def conv2d(N, H, W, CO, CI, KH, KW, stride, padding):
+    data = te.placeholder((N, CI, H, W), name="data")
+    kernel = te.placeholder((CO, CI, KH, KW), name="kernel")
+    conv = topi.nn.conv2d_nchw(data, kernel, stride, padding, dilation=1, out_dtype="float32")
+    return [data, kernel, conv]
+
+
+# SearchTasks by workload key. The compute DAG and the schedule steps applied to
+# it do not depend on the target, so one task serves every target of a workload.
+_search_tasks = {}
+
+
+def search_task(line, target):
+    """
+    SearchTask of a sketch line's workload, created once per workload (with the
+    target of the first request) and reused for later records and targets.
+    """
+    key = workload_key(line)
+    if key not in _search_tasks:
+        w = parse_workload(line)
+        _search_tasks[key] = auto_scheduler.SearchTask(
+            func=conv2d,
+            args=(w["N"], w["H"], w["W"], w["CO"], w["CI"], w["KH"], w["KW"], w["strides"], w["padding"]),
+            target=target,
+        )
+    return _search_tasks[key]
+
+
+def apply_sketch(line, target):
+    """
+    Apply the schedule state of a sketch line to its workload's compute DAG.
+    Returns (sch, args) ready for tvm.lower / tvm.build (for any CUDA target).
+    """
+    task = search_task(line, target)
+    inp, _ = load_record_from_string(line)
+    return task.compute_dag.apply_steps_from_state(inp.state, task.layout_rewrite_option)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Validate every sketch of a log against the GPU per-block limits, in parallel.
+
+Each record is lowered with TVM and checked with verify_gpu_code using the
+limits of its target architecture (device_profiles.verify_limits). Verdicts
+are cached in validation_cache.json keyed by (schedule, limits): lowering does not
+depend on the target, and all supported architectures share the same limits, so
+a schedule is verified once for every target and arch, and re-runs and
+genkernel.py only lower records they have not seen. Rejected records are written
+to a CSV report.
+
+genkernel.py reads the same cache and skips invalid records instead of aborting.
+
+Usage:
+    python validate_sketches.py -f allkernels.json.A100
+    python validate_sketches.py -f allkernels.json --arch sm_89 -j 16
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+from device_profiles import limits_key, normalize_arch, verify_limits
+from sketch_records import (
+    launch_dims,
+    load_sketch_lines,
+    parse_workload,
+    schedule_key,
+    sketch_hash,
+    target_arch,
+)
+
+# Default verdict cache and report files
+VALIDATION_CACHE = "validation_cache.json"
+REPORT_FILE = "validation_report.csv"
+
+
+def verdict_key(line, arch):
+    """
+    Cache key of a record's verdict on an architecture: its target-independent
+    schedule and the architecture's verify limits, so archs with equal limits
+    share verdicts.
+    """
+    return f"{schedule_key(line)}:{limits_key(arch)}"
+
+
+def load_verdicts(path=VALIDATION_CACHE):
+    """Load cached verdicts ({key: {"valid": bool, "reason": str}}), or {} if absent."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_verdicts(verdicts, path=VALIDATION_CACHE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(verdicts, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def verify_primfunc(primfunc, arch):
+    """Run verify_gpu_code on a lowered PrimFunc with the limits of arch."""
+    from tvm.tir.analysis import verify_gpu_code
+    return bool(verify_gpu_code(primfunc, verify_limits(arch)))
+
+
+def rejection_reason(line, arch):
+    """Best-effort explanation of why verify_gpu_code rejected a record."""
+    limits = verify_limits(arch)
+    _, block = launch_dims(line)
+    if block > limits["max_threads_per_block"]:
+        return f"threads per block {block} > {limits['max_threads_per_block']}"
+    return (f"verify_gpu_code rejected (shared memory > {limits['max_shared_memory_per_block']} B, "
+            f"thread extent or vector width limit)")
+
+
+def validate_record(line, arch):
+    """
+    Lower one record and verify it. Returns {"valid": bool, "reason": str}.
+    Lowering errors are reported as invalid records, not raised.
+    """
+    import tvm
+    from tvm_workloads import apply_sketch
+
+    try:
+        sch, args = apply_sketch(line, tvm.target.Target("cuda"))
+        primfunc = tvm.lower(sch, args)["main"]
+    except Exception as e:
+        return {"valid": False, "reason": f"lowering failed: {e}".splitlines()[0]}
+
+    if verify_primfunc(primfunc, arch):
+        return {"valid": True, "reason": ""}
+    return {"valid": False, "reason": rejection_reason(line, arch)}
+
+
+def _validate_worker(job):
+    idx, line, arch = job
+    return idx, validate_record(line, arch)
+
+
+def record_arch(line, arch_override=None):
+    """Architecture a record is validated for: the override, else the record's own target."""
+    return normalize_arch(arch_override or target_arch(line))
+
+
+def validate_log(log_file, arch_override=None, jobs=None, cache_path=VALIDATION_CACHE):
+    """
+    Validate every record of log_file, reusing cached verdicts.
+    Returns a list of (config_idx, arch, verdict) in log order.
+    """
+    lines = load_sketch_lines(log_file)
+    verdicts = load_verdicts(cache_path)
+
+    pending = []
+    for idx, line in enumerate(lines):
+        arch = record_arch(line, arch_override)
+        if verdict_key(line, arch) not in verdicts:
+            pending.append((idx, line, arch))
+
+    print(f"{len(lines)} record(s), {len(lines) - len(pending)} cached, {len(pending)} to validate")
+    if pending:
+        with Pool(processes=jobs) as pool:
+            for done, (idx, verdict) in enumerate(pool.imap_unordered(_validate_worker, pending), 1):
+                line = lines[idx]
+                verdicts[verdict_key(line, record_arch(line, arch_override))] = verdict
+                if done % 20 == 0 or done == len(pending):
+                    print(f"  validated {done}/{len(pending)}")
+        save_verdicts(verdicts, cache_path)
+
+    results = []
+    for idx, line in enumerate(lines):
+        arch = record_arch(line, arch_override)
+        results.append((idx, arch, verdicts[verdict_key(line, arch)]))
+    return results
+
+
+def write_report(log_file, results, report_file=REPORT_FILE):
+    """Write the rejected records of validate_log() to a CSV report."""
+    lines = load_sketch_lines(log_file)
+    rejected = [(idx, arch, v) for idx, arch, v in results if not v["valid"]]
+    with open(report_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["config", "sketch_hash", "arch", "N", "H", "W", "CO", "CI", "KH", "KW",
+                         "stride", "padding", "reason"])
+        for idx, arch, verdict in rejected:
+            w = parse_workload(lines[idx])
+            writer.writerow([idx, sketch_hash(lines[idx]), arch,
+                             w["N"], w["H"], w["W"], w["CO"], w["CI"], w["KH"], w["KW"],
+                             w["strides"][0], w["padding"][0], verdict["reason"]])
+    return rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate sketches against the GPU per-block limits")
+    parser.add_argument("--log-file", "-f", type=str, default="allkernels.json",
+                        help="Path to the sketch JSON file (default: allkernels.json)")
+    parser.add_argument("--arch", type=str, default=None,
+                        help="Validate for this architecture (default: each record's -arch target)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Parallel workers (default: CPU count)")
+    parser.add_argument("--cache", type=str, default=VALIDATION_CACHE,
+                        help=f"Verdict cache file (default: {VALIDATION_CACHE})")
+    parser.add_argument("--report", type=str, default=REPORT_FILE,
+                        help=f"Report of rejected records (default: {REPORT_FILE})")
+    args = parser.parse_args()
+
+    results = validate_log(args.log_file, args.arch, args.jobs, args.cache)
+    rejected = write_report(args.log_file, results, args.report)
+
+    print(f"\nValid: {len(results) - len(rejected)}/{len(results)}")
+    if rejected:
+        print(f"Rejected {len(rejected)} record(s), see {args.report}:")
+        for idx, arch, verdict in rejected:
+            print(f"  config {idx} ({arch}): {verdict['reason']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())